@@ -0,0 +1,149 @@
+import os
+import csv
+import argparse
+
+import numpy as np
+
+from gaze_data import load_gaze, GazeIndex
+from session_io import parse_time, read_aoi_names, write_session_csv
+
+
+class AOIGeometry:
+    """
+    The area of one AOI in scene camera pixels, valid from start_ms to end_ms of the video.
+    Two points are the corners of a rectangle, three or more the vertices of a polygon.
+    """
+
+    def __init__(self, name: str, points, start_ms: int = None, end_ms: int = None):
+        self.name = name
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self.points) < 2:
+            raise ValueError(f"AOI {name} needs at least two points")
+        self.start_ms = start_ms  # None = from the start of the video
+        self.end_ms = end_ms  # None = to the end of the video
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Vectorized hit test of all samples, NaN gaze never hits."""
+        if len(self.points) == 2:
+            (x0, y0), (x1, y1) = np.sort(self.points, axis=0)
+            return (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+
+        # Even-odd ray casting, one vectorized pass per edge
+        inside = np.zeros(len(x), dtype=bool)
+        xj, yj = self.points[-1]
+        for xi, yi in self.points:
+            crosses = (yi > y) != (yj > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+            inside ^= crosses & (x < x_cross)
+            xj, yj = xi, yi
+        return inside
+
+
+def load_aoi_geometry(geometry_path: str, aoi_names=None) -> list:
+    """
+    Read the AOI geometry CSV with the columns AOI, Start Time, End Time, Points:
+    times in hh:mm:ss.mmm (empty = the whole video) and points as "x y;x y;...".
+    Several rows of one AOI with different times describe a moving AOI.
+    """
+    geometries = []
+    with open(geometry_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            name = row["AOI"].strip()
+            if aoi_names is not None and name not in aoi_names:
+                raise ValueError(f"AOI {name} is not in AOI.csv")
+            points = [[float(v) for v in point.split()] for point in row["Points"].split(";") if point.strip()]
+            start = row.get("Start Time", "").strip()
+            end = row.get("End Time", "").strip()
+            geometries.append(AOIGeometry(
+                name, points,
+                parse_time(start) if start else None,
+                parse_time(end) if end else None
+            ))
+    return geometries
+
+
+def classify_samples(times_ms: np.ndarray, x: np.ndarray, y: np.ndarray, geometries) -> dict:
+    """Boolean hit array per AOI name; a time-varying AOI only tests the samples of each of its time ranges."""
+    hits = {}
+    for geometry in geometries:
+        start = 0 if geometry.start_ms is None else int(np.searchsorted(times_ms, geometry.start_ms, side="left"))
+        end = len(times_ms) if geometry.end_ms is None else int(np.searchsorted(times_ms, geometry.end_ms, side="right"))
+        aoi_hits = hits.setdefault(geometry.name, np.zeros(len(times_ms), dtype=bool))
+        aoi_hits[start:end] |= geometry.contains(x[start:end], y[start:end])
+    return hits
+
+
+def hits_to_dwells(times_ms: np.ndarray, hits: np.ndarray, min_duration_ms: float = 100.0,
+                   max_gap_ms: float = 100.0, dropout_ms: float = 100.0):
+    """
+    Merge runs of hits into dwell intervals (in ms, out ms).
+
+    A run also ends where no sample arrived for more than dropout_ms; dwells less
+    than max_gap_ms apart are bridged, and dwells shorter than min_duration_ms dropped.
+    """
+    if not len(times_ms):
+        return np.zeros(0), np.zeros(0)
+
+    # A new run starts at a hit that follows a miss or a dropout
+    previous_hit = np.concatenate(([False], hits[:-1]))
+    dropout = np.concatenate(([True], np.diff(times_ms) > dropout_ms))
+    run_start = hits & (~previous_hit | dropout)
+    next_hit = np.concatenate((hits[1:], [False]))
+    next_dropout = np.concatenate((dropout[1:], [True]))
+    run_end = hits & (~next_hit | next_dropout)
+
+    ins = times_ms[run_start]
+    outs = times_ms[run_end]
+    if not len(ins):
+        return ins, outs
+
+    # Bridge the short gaps between consecutive dwells
+    keep_break = np.concatenate(([True], ins[1:] - outs[:-1] > max_gap_ms))
+    group_start = np.flatnonzero(keep_break)
+    group_end = np.concatenate((group_start[1:], [len(ins)])) - 1
+    ins, outs = ins[group_start], outs[group_end]
+
+    long_enough = outs - ins >= min_duration_ms
+    return ins[long_enough], outs[long_enough]
+
+
+def detect_dwells(gaze: np.ndarray, geometries, offset_ms: float = 0.0, min_duration_ms: float = 100.0,
+                  max_gap_ms: float = 100.0, dropout_ms: float = 100.0) -> list:
+    """The (AOI, in ms, out ms) keyframes of all AOIs, sorted by in time."""
+    index = GazeIndex(gaze, offset_ms)
+    times_ms = index.to_video_ms(index.timestamps)
+    x = np.asarray(gaze["x"], dtype=np.float64)
+    y = np.asarray(gaze["y"], dtype=np.float64)
+
+    keyframes = []
+    for name, hits in classify_samples(times_ms, x, y, geometries).items():
+        ins, outs = hits_to_dwells(times_ms, hits, min_duration_ms, max_gap_ms, dropout_ms)
+        keyframes.extend(
+            (name, int(round(in_ms)), int(round(out_ms)))
+            for in_ms, out_ms in zip(ins, outs) if out_ms >= 0  # Nothing before the video starts
+        )
+    keyframes.sort(key=lambda keyframe: (keyframe[1], keyframe[0]))
+    return [(name, max(in_ms, 0), out_ms) for name, in_ms, out_ms in keyframes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate AOI keyframes from gaze data for review in KeyFramer.")
+    parser.add_argument("gaze", help="gaze_positions.csv")
+    parser.add_argument("geometry", help="AOI geometry CSV (AOI, Start Time, End Time, Points)")
+    parser.add_argument("session", help="session CSV to write, e.g. 'KeyFramer Sessions/P01.csv'")
+    parser.add_argument("--aoi-file", default=os.path.join("KeyFramer Sessions", "AOI.csv"),
+                        help="AOI.csv with the allowed AOI names, skipped if missing")
+    parser.add_argument("--offset-ms", type=float, default=0.0, help="tracker time minus video time")
+    parser.add_argument("--min-duration-ms", type=float, default=100.0)
+    parser.add_argument("--max-gap-ms", type=float, default=100.0)
+    parser.add_argument("--dropout-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    aoi_names = read_aoi_names(args.aoi_file) if os.path.exists(args.aoi_file) else None
+    keyframes = detect_dwells(
+        load_gaze(args.gaze), load_aoi_geometry(args.geometry, aoi_names), args.offset_ms,
+        args.min_duration_ms, args.max_gap_ms, args.dropout_ms
+    )
+    write_session_csv(args.session, keyframes)
+    print(f"{len(keyframes)} keyframes written to {args.session}")
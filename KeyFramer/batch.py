@@ -0,0 +1,266 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from gaze_data import load_gaze, source_stamp
+from session_io import read_aoi_names, write_session_csv
+from aoi_detection import load_aoi_geometry, detect_dwells
+from fixations import detect_fixations, saccades_between
+
+try:
+    import cv2  # Optional, only for the frame rate and length of the videos
+except ImportError:
+    cv2 = None
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+GAZE_FILE = "gaze_positions.csv"
+GEOMETRY_FILE = "aoi_geometry.csv"
+OFFSETS_FILE = "offsets.csv"
+STATE_FILE = "batch_state.json"
+SUMMARY_FILE = "batch_summary.csv"
+
+# The settings of run_batch, the same as the defaults of the command line
+DEFAULT_SETTINGS = {"min_duration_ms": 100.0, "max_gap_ms": 100.0, "dropout_ms": 100.0, "fixations": "idt"}
+
+# Bump when the statistics change, so finished participants are processed again
+BATCH_VERSION = 1
+
+
+def find_participants(study_dir: str) -> list:
+    """
+    Every subfolder with a gaze_positions.csv is one participant, named after the folder.
+    Its video is the first video file in the folder, its geometry its own aoi_geometry.csv
+    or else the one shared in the study folder.
+    """
+    shared_geometry = os.path.join(study_dir, GEOMETRY_FILE)
+    participants = []
+    for name in sorted(os.listdir(study_dir)):
+        folder = os.path.join(study_dir, name)
+        gaze_path = os.path.join(folder, GAZE_FILE)
+        if not os.path.isfile(gaze_path):
+            continue
+        videos = sorted(f for f in os.listdir(folder) if f.lower().endswith(VIDEO_EXTENSIONS))
+        geometry_path = os.path.join(folder, GEOMETRY_FILE)
+        if not os.path.isfile(geometry_path):
+            geometry_path = shared_geometry if os.path.isfile(shared_geometry) else None
+        participants.append({
+            "participant": name,
+            "gaze": gaze_path,
+            "video": os.path.join(folder, videos[0]) if videos else None,
+            "geometry": geometry_path,
+        })
+    return participants
+
+
+def read_offsets(offsets_path: str) -> dict:
+    """offsets.csv holds the columns Participant, Offset ms (tracker time minus video time)."""
+    if not os.path.isfile(offsets_path):
+        return {}
+    with open(offsets_path, "r", newline="") as f:
+        return {row["Participant"].strip(): float(row["Offset ms"]) for row in csv.DictReader(f)}
+
+
+def video_info(video_path: str) -> dict:
+    """The frame rate and length of the video, empty without OpenCV or a readable video."""
+    if cv2 is None or video_path is None:
+        return {}
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return {}
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        cap.release()
+    if fps <= 0:
+        return {}
+    return {"fps": fps, "video_ms": int(frames / fps * 1000)}
+
+
+def job_stamp(job: dict, settings: dict) -> dict:
+    """What a finished participant depends on; a change in any of it processes it again."""
+    stamp = {"version": BATCH_VERSION, "settings": settings, "offset_ms": job["offset_ms"],
+             "gaze": source_stamp(job["gaze"])}
+    for key in ("video", "geometry"):
+        if job[key] is not None:
+            stat = os.stat(job[key])
+            stamp[key] = {"path": job[key], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stamp
+
+
+def dwell_statistics(keyframes) -> dict:
+    """Dwell count, total and mean duration (ms) per AOI."""
+    statistics = {}
+    for aoi, in_ms, out_ms in keyframes:
+        aoi_stats = statistics.setdefault(aoi, {"dwells": 0, "total_ms": 0})
+        aoi_stats["dwells"] += 1
+        aoi_stats["total_ms"] += out_ms - in_ms
+    for aoi_stats in statistics.values():
+        aoi_stats["mean_ms"] = aoi_stats["total_ms"] / aoi_stats["dwells"]
+    return statistics
+
+
+def process_participant(job: dict, sessions_dir: str, aoi_names, settings: dict) -> dict:
+    """
+    Run AOI detection, keyframe generation and statistics for one participant and write
+    its session CSV. Runs in a worker process, so everything passed in and out is plain data.
+    """
+    started = time.perf_counter()
+    gaze = load_gaze(job["gaze"])
+    info = video_info(job["video"])
+
+    statistics = {"samples": len(gaze), "offset_ms": job["offset_ms"], **info}
+    if len(gaze):
+        statistics["recording_ms"] = int((int(gaze["timestamp"][-1]) - int(gaze["timestamp"][0])) / 1e6)
+        statistics["valid_share"] = float(np.mean(np.isfinite(gaze["x"]) & np.isfinite(gaze["y"])))
+
+    session_path = None
+    if job["geometry"] is not None:
+        keyframes = detect_dwells(
+            gaze, load_aoi_geometry(job["geometry"], aoi_names), job["offset_ms"],
+            settings["min_duration_ms"], settings["max_gap_ms"], settings["dropout_ms"]
+        )
+        # No keyframes past the end of the video
+        if "video_ms" in info:
+            keyframes = [(aoi, in_ms, min(out_ms, info["video_ms"])) for aoi, in_ms, out_ms in keyframes
+                         if in_ms < info["video_ms"]]
+        session_path = os.path.join(sessions_dir, f"{job['participant']}.csv")
+        write_session_csv(session_path, keyframes)
+        statistics["keyframes"] = len(keyframes)
+        statistics["aois"] = dwell_statistics(keyframes)
+
+    if settings["fixations"] and len(gaze):
+        fixations = detect_fixations(gaze, settings["fixations"])
+        statistics["fixations"] = len(fixations)
+        statistics["mean_fixation_ms"] = float(fixations["duration"].mean()) if len(fixations) else 0.0
+        statistics["saccades"] = len(saccades_between(fixations))
+
+    statistics["seconds"] = time.perf_counter() - started
+    return {"session": session_path, "statistics": statistics}
+
+
+def load_state(state_path: str) -> dict:
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state_path: str, state: dict) -> None:
+    """Write through a temporary file, so a crash while saving keeps the previous state."""
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(temp_path, state_path)
+
+
+def write_summary(summary_path: str, state: dict) -> None:
+    """One row per participant and AOI (or one row without AOIs), the status and statistics of the run."""
+    columns = ["Participant", "Status", "Keyframes", "Samples", "Valid Share", "Fixations",
+               "Mean Fixation ms", "Saccades", "AOI", "Dwells", "Total Dwell ms", "Mean Dwell ms", "Error"]
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for participant, entry in sorted(state.items()):
+            statistics = entry.get("statistics", {})
+            row = [participant, entry["status"], statistics.get("keyframes", ""), statistics.get("samples", ""),
+                   statistics.get("valid_share", ""), statistics.get("fixations", ""),
+                   statistics.get("mean_fixation_ms", ""), statistics.get("saccades", "")]
+            aois = statistics.get("aois") or {"": {}}
+            for aoi, aoi_stats in sorted(aois.items()):
+                writer.writerow(row + [aoi, aoi_stats.get("dwells", ""), aoi_stats.get("total_ms", ""),
+                                       aoi_stats.get("mean_ms", ""), entry.get("error", "")])
+
+
+def run_batch(study_dir: str, output_dir: str = None, jobs: int = None, settings: dict = None,
+              offset_ms: float = 0.0, force: bool = False) -> dict:
+    """
+    Process every participant of the study folder in a process pool and return the state.
+
+    The state file records each finished participant with the stamp of its inputs and is
+    saved after every participant, so a run restarted after a crash skips what is done and
+    retries what failed.
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    output_dir = output_dir or study_dir
+    sessions_dir = os.path.join(output_dir, "KeyFramer Sessions")
+    os.makedirs(sessions_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+
+    aoi_file = os.path.join(study_dir, "AOI.csv")
+    aoi_names = read_aoi_names(aoi_file) if os.path.isfile(aoi_file) else None
+    offsets = read_offsets(os.path.join(study_dir, OFFSETS_FILE))
+
+    state = {} if force else load_state(state_path)
+    pending = []
+    skipped = 0
+    for job in find_participants(study_dir):
+        job["offset_ms"] = offsets.get(job["participant"], offset_ms)
+        stamp = job_stamp(job, settings)
+        entry = state.get(job["participant"])
+        if entry is not None and entry["status"] == "done" and entry["stamp"] == stamp:
+            skipped += 1
+            continue
+        pending.append((job, stamp))
+
+    total = len(pending)
+    print(f"{total} participants to process, {skipped} already done", flush=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(process_participant, job, sessions_dir, aoi_names, settings): (job, stamp)
+            for job, stamp in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            job, stamp = futures[future]
+            participant = job["participant"]
+            try:
+                result = future.result()
+            except Exception as e:  # A bad recording must not stop the others
+                state[participant] = {"status": "failed", "stamp": stamp, "error": f"{type(e).__name__}: {e}"}
+                print(f"[{done}/{total}] {participant} failed: {e}", flush=True)
+            else:
+                state[participant] = {"status": "done", "stamp": stamp, **result}
+                statistics = result["statistics"]
+                print(f"[{done}/{total}] {participant}: {statistics.get('keyframes', 0)} keyframes, "
+                      f"{statistics.get('fixations', 0)} fixations ({statistics['seconds']:.1f} s)", flush=True)
+            save_state(state_path, state)
+
+    write_summary(os.path.join(output_dir, SUMMARY_FILE), state)
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Process a study folder headless: one subfolder per participant with gaze_positions.csv, "
+                    "a video and optionally aoi_geometry.csv (else the shared one in the study folder)."
+    )
+    parser.add_argument("study", help="the study folder, optionally with AOI.csv, aoi_geometry.csv and offsets.csv")
+    parser.add_argument("--output", default=None, help="where to write the sessions, state and summary (default: study)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--offset-ms", type=float, default=0.0, help="offset of participants missing in offsets.csv")
+    parser.add_argument("--min-duration-ms", type=float, default=DEFAULT_SETTINGS["min_duration_ms"])
+    parser.add_argument("--max-gap-ms", type=float, default=DEFAULT_SETTINGS["max_gap_ms"])
+    parser.add_argument("--dropout-ms", type=float, default=DEFAULT_SETTINGS["dropout_ms"])
+    parser.add_argument("--fixations", choices=["ivt", "idt", "none"], default=DEFAULT_SETTINGS["fixations"],
+                        help="fixation detector for the statistics, I-DT is more robust to unfiltered gaze")
+    parser.add_argument("--force", action="store_true", help="ignore the state of earlier runs")
+    args = parser.parse_args()
+
+    settings = {
+        "min_duration_ms": args.min_duration_ms,
+        "max_gap_ms": args.max_gap_ms,
+        "dropout_ms": args.dropout_ms,
+        "fixations": None if args.fixations == "none" else args.fixations,
+    }
+    state = run_batch(args.study, args.output, args.jobs, settings, args.offset_ms, args.force)
+    failed = sorted(participant for participant, entry in state.items() if entry["status"] != "done")
+    print(f"{len(state) - len(failed)} done, {len(failed)} failed" + (f": {', '.join(failed)}" if failed else ""))
+    sys.exit(1 if failed else 0)
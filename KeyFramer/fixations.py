@@ -0,0 +1,262 @@
+import csv
+import argparse
+
+import numpy as np
+
+from gaze_data import load_gaze
+
+# Approximate pixels per degree of a 1600x1200 scene camera with a ~103 degree horizontal field of view
+SCENE_PX_PER_DEGREE = 1600 / 103
+
+# One fixation: first and last sample time (ns), duration (ms), centroid and dispersion (px), sample count
+FIXATION_DTYPE = np.dtype([
+    ("start", "<i8"), ("end", "<i8"), ("duration", "<f4"),
+    ("x", "<f4"), ("y", "<f4"), ("dispersion", "<f4"), ("samples", "<i4")
+])
+
+# One saccade between two fixations: start/end time (ns), duration (ms) and amplitude (px)
+SACCADE_DTYPE = np.dtype([("start", "<i8"), ("end", "<i8"), ("duration", "<f4"), ("amplitude", "<f4")])
+
+
+def valid_samples(timestamps, x, y):
+    """Drop the dropouts (NaN gaze); returns the kept indexes and their arrays."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    return keep, np.asarray(timestamps, dtype=np.int64)[keep], x[keep], y[keep]
+
+
+def range_reduce(values, starts, ends, ufunc):
+    """ufunc over values[start:end + 1] for every (start, end) pair in one reduceat call."""
+    padded = np.append(values, values[-1:])  # reduceat needs end + 1 to be a valid index
+    indices = np.empty(2 * len(starts), dtype=np.intp)
+    indices[0::2] = starts
+    indices[1::2] = ends + 1
+    return ufunc.reduceat(padded, indices)[0::2]
+
+
+def fixation_table(t, x, y, starts, ends):
+    """The fixation rows of the sample ranges [start, end], vectorized."""
+    table = np.zeros(len(starts), dtype=FIXATION_DTYPE)
+    if not len(starts):
+        return table
+    counts = ends - starts + 1
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    table["start"] = t[starts]
+    table["end"] = t[ends]
+    table["duration"] = (t[ends] - t[starts]) / 1e6
+    table["x"] = (sum_x[ends + 1] - sum_x[starts]) / counts
+    table["y"] = (sum_y[ends + 1] - sum_y[starts]) / counts
+    table["dispersion"] = (
+        range_reduce(x, starts, ends, np.maximum) - range_reduce(x, starts, ends, np.minimum)
+        + range_reduce(y, starts, ends, np.maximum) - range_reduce(y, starts, ends, np.minimum)
+    )
+    table["samples"] = counts
+    return table
+
+
+def ivt(timestamps, x, y, velocity_threshold=30.0, min_duration_ms=60.0, max_gap_ms=75.0,
+        px_per_degree=SCENE_PX_PER_DEGREE, final=True):
+    """
+    Velocity-threshold identification: a sample belongs to a fixation when the gaze moved
+    slower than velocity_threshold (deg/s) since the previous sample. Runs of such samples
+    lasting min_duration_ms become fixations; more than max_gap_ms without a valid sample
+    (blink, dropout) ends a run.
+
+    Returns the fixations and the index to resume from with more data. With final=False a
+    fixation still running at the last sample is left for the next call.
+    """
+    keep, t, x, y = valid_samples(timestamps, x, y)
+    n = len(t)
+    if n < 2:
+        return np.zeros(0, dtype=FIXATION_DTYPE), (keep[0] if n and not final else len(timestamps))
+
+    dt = np.diff(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        velocity = np.hypot(np.diff(x), np.diff(y)) / (dt / 1e9)
+    velocity[(dt > max_gap_ms * 1e6) | (dt <= 0)] = np.inf  # No velocity across a gap
+    slow = np.concatenate(([False], velocity < velocity_threshold * px_per_degree))
+
+    previous = np.concatenate(([False], slow[:-1]))
+    following = np.concatenate((slow[1:], [False]))
+    starts = np.flatnonzero(slow & ~previous)
+    ends = np.flatnonzero(slow & ~following)
+
+    resume = len(timestamps)
+    if not final:
+        if slow[-1]:
+            # Resume one sample early, the velocity of the first sample needs the one before
+            resume = keep[starts[-1] - 1]
+            starts, ends = starts[:-1], ends[:-1]
+        else:
+            resume = keep[-1]
+
+    long_enough = t[ends] - t[starts] >= min_duration_ms * 1e6
+    return fixation_table(t, x, y, starts[long_enough], ends[long_enough]), resume
+
+
+def idt(timestamps, x, y, dispersion_threshold=1.5, min_duration_ms=100.0, max_gap_ms=75.0,
+        max_duration_ms=5000.0, px_per_degree=SCENE_PX_PER_DEGREE, final=True):
+    """
+    Dispersion-threshold identification: the longest window from each sample whose
+    dispersion (x range + y range) stays within dispersion_threshold (deg) is found for all
+    samples at once by binary lifting over sparse min/max tables, then windows of at least
+    min_duration_ms are taken greedily. Windows do not cross gaps longer than max_gap_ms,
+    and fixations longer than max_duration_ms are split.
+
+    Returns the fixations and the index to resume from with more data, see ivt.
+    """
+    keep, t, x, y = valid_samples(timestamps, x, y)
+    n = len(t)
+    if n < 2:
+        return np.zeros(0, dtype=FIXATION_DTYPE), (keep[0] if n and not final else len(timestamps))
+
+    # Last sample of the gap-free segment of every sample
+    segment_start = np.concatenate(([True], np.diff(t) > max_gap_ms * 1e6))
+    segment_first = np.flatnonzero(segment_start)
+    segment_last = np.concatenate((segment_first[1:], [n])) - 1
+    segment_end = np.repeat(segment_last, np.diff(np.concatenate((segment_first, [n]))))
+
+    # Longest window in samples, from the typical sampling interval
+    sample_ms = max(float(np.median(np.diff(t))) / 1e6, 1e-3)
+    max_samples = int(np.clip(np.ceil(max_duration_ms / sample_ms) + 1, 2, n))
+    levels = int(np.ceil(np.log2(max_samples)))
+
+    # Sparse tables: level k holds the min/max over [i, i + 2**k - 1], clamped at the end
+    # (float32 like the gaze file, which halves the memory traffic of building them)
+    tables = []
+    for values in (x.astype(np.float32), y.astype(np.float32)):
+        low, high = [values], [values]
+        for k in range(1, levels + 1):
+            step = min(1 << (k - 1), n - 1)
+            for table, ufunc in ((low, np.minimum), (high, np.maximum)):
+                level = table[-1].copy()
+                ufunc(level[:-step], table[-1][step:], out=level[:-step])
+                table.append(level)
+        tables.append((low, high))
+
+    # Binary lifting: append the next 2**k samples to every window while it stays within the
+    # threshold, keeping the running min/max of each window
+    limit = np.minimum(segment_end, np.arange(n) + max_samples - 1)
+    threshold = dispersion_threshold * px_per_degree
+    window_end = np.arange(n)
+    (low_x, high_x), (low_y, high_y) = tables
+    min_x, max_x, min_y, max_y = low_x[0].copy(), low_x[0].copy(), low_y[0].copy(), low_y[0].copy()
+    for k in range(levels, -1, -1):
+        open_windows = np.flatnonzero(window_end + (1 << k) <= limit)
+        block = window_end[open_windows] + 1  # The 2**k samples after the window
+        new_min_x = np.minimum(min_x[open_windows], low_x[k][block])
+        new_max_x = np.maximum(max_x[open_windows], high_x[k][block])
+        new_min_y = np.minimum(min_y[open_windows], low_y[k][block])
+        new_max_y = np.maximum(max_y[open_windows], high_y[k][block])
+        fits = (new_max_x - new_min_x) + (new_max_y - new_min_y) <= threshold
+        grown = open_windows[fits]
+        window_end[grown] += 1 << k
+        min_x[grown], max_x[grown] = new_min_x[fits], new_max_x[fits]
+        min_y[grown], max_y[grown] = new_min_y[fits], new_max_y[fits]
+
+    is_fixation = t[window_end] - t >= min_duration_ms * 1e6
+    # Next sample at or after i that starts a fixation, n if none
+    fixation_index = np.where(is_fixation, np.arange(n), n)
+    next_fixation = np.minimum.accumulate(fixation_index[::-1])[::-1]
+
+    # Windows reaching the last sample could grow with more data
+    tail_start = n
+    if not final:
+        reaches_end = np.flatnonzero((window_end == n - 1) & (segment_end == n - 1))
+        tail_start = int(reaches_end[0]) if len(reaches_end) else n
+
+    starts, ends = [], []
+    i = 0
+    while i < tail_start:
+        i = int(next_fixation[i])
+        if i >= tail_start:
+            i = tail_start
+            break
+        starts.append(i)
+        ends.append(int(window_end[i]))
+        i = ends[-1] + 1
+
+    resume = len(timestamps) if final or i >= n else keep[i]
+    return fixation_table(t, x, y, np.array(starts, dtype=np.intp), np.array(ends, dtype=np.intp)), resume
+
+
+DETECTORS = {"ivt": ivt, "idt": idt}
+
+
+def detect_fixations_chunked(chunks, method="ivt", **params):
+    """
+    Detect fixations over an iterable of GAZE_DTYPE chunks, e.g. gaze_data.iter_gaze_chunks,
+    yielding one fixation table per chunk. The samples of a fixation still running at the end
+    of a chunk are carried over, so the result does not depend on where the chunks are cut.
+    """
+    detector = DETECTORS[method]
+    carry = None
+    for chunk in chunks:
+        data = chunk if carry is None or not len(carry) else np.concatenate((carry, chunk))
+        fixations, resume = detector(data["timestamp"], data["x"], data["y"], final=False, **params)
+        carry = data[resume:]
+        yield fixations
+    if carry is not None and len(carry):
+        fixations, _ = detector(carry["timestamp"], carry["x"], carry["y"], final=True, **params)
+        yield fixations
+
+
+def detect_fixations(gaze, method="ivt", chunk_rows=1 << 16, **params):
+    """Fixation table of a whole gaze array (or memmap), processed chunk_rows at a time to bound memory."""
+    chunks = (gaze[i:i + chunk_rows] for i in range(0, len(gaze), chunk_rows))
+    tables = list(detect_fixations_chunked(chunks, method, **params))
+    return np.concatenate(tables) if tables else np.zeros(0, dtype=FIXATION_DTYPE)
+
+
+def saccades_between(fixations, max_interval_ms=150.0):
+    """The saccades between consecutive fixations at most max_interval_ms apart, longer pauses are gaps."""
+    if len(fixations) < 2:
+        return np.zeros(0, dtype=SACCADE_DTYPE)
+    before, after = fixations[:-1], fixations[1:]
+    interval = (after["start"] - before["end"]) / 1e6
+    keep = interval <= max_interval_ms
+    table = np.zeros(int(keep.sum()), dtype=SACCADE_DTYPE)
+    table["start"] = before["end"][keep]
+    table["end"] = after["start"][keep]
+    table["duration"] = interval[keep]
+    table["amplitude"] = np.hypot(after["x"][keep] - before["x"][keep], after["y"][keep] - before["y"][keep])
+    return table
+
+
+def write_table_csv(path, table):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(table.dtype.names)
+        writer.writerows(table.tolist())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect fixations and saccades in gaze_positions.csv.")
+    parser.add_argument("gaze", help="gaze_positions.csv")
+    parser.add_argument("--method", choices=sorted(DETECTORS), default="ivt")
+    parser.add_argument("--output", default="fixations.csv")
+    parser.add_argument("--saccades", default=None, help="also write the saccade table to this CSV")
+    parser.add_argument("--velocity", type=float, default=30.0, help="I-VT threshold (deg/s)")
+    parser.add_argument("--dispersion", type=float, default=1.5, help="I-DT threshold (deg)")
+    parser.add_argument("--min-duration-ms", type=float, default=None)
+    parser.add_argument("--max-gap-ms", type=float, default=75.0)
+    parser.add_argument("--px-per-degree", type=float, default=SCENE_PX_PER_DEGREE)
+    args = parser.parse_args()
+
+    params = {"max_gap_ms": args.max_gap_ms, "px_per_degree": args.px_per_degree}
+    if args.method == "ivt":
+        params["velocity_threshold"] = args.velocity
+    else:
+        params["dispersion_threshold"] = args.dispersion
+    if args.min_duration_ms is not None:
+        params["min_duration_ms"] = args.min_duration_ms
+
+    fixations = detect_fixations(load_gaze(args.gaze), args.method, **params)
+    write_table_csv(args.output, fixations)
+    print(f"{len(fixations)} fixations written to {args.output}")
+    if args.saccades:
+        saccades = saccades_between(fixations)
+        write_table_csv(args.saccades, saccades)
+        print(f"{len(saccades)} saccades written to {args.saccades}")
@@ -0,0 +1,211 @@
+import os
+import json
+from itertools import islice
+
+import numpy as np
+
+# One gaze sample: the tracker time in ns and the position in scene camera pixels
+GAZE_DTYPE = np.dtype([("timestamp", "<i8"), ("x", "<f4"), ("y", "<f4")])
+
+# The header names of the columns read from gaze_positions.csv, other columns are skipped
+GAZE_COLUMNS = ("timestamp [ns]", "gaze x [px]", "gaze y [px]")
+
+# Bump when the sidecar layout changes, so old sidecars are rebuilt
+SIDECAR_VERSION = 1
+
+
+def sidecar_path(csv_path: str) -> str:
+    """The binary cache next to the CSV, e.g. gaze_positions.csv.npy."""
+    return csv_path + ".npy"
+
+
+def read_gaze_columns(header_line: str) -> list:
+    """Find the indexes of GAZE_COLUMNS in the header, in that order."""
+    header = [name.strip() for name in header_line.strip().split(",")]
+    missing = [name for name in GAZE_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Not a gaze file, missing columns: {', '.join(missing)}")
+    return [header.index(name) for name in GAZE_COLUMNS]
+
+
+def iter_gaze_chunks(csv_path: str, chunk_rows: int = 1_000_000):
+    """
+    Parse the CSV chunk by chunk straight into GAZE_DTYPE arrays,
+    so only one chunk of text is held in memory at a time.
+    """
+    with open(csv_path, "r", newline="") as f:
+        columns = read_gaze_columns(f.readline())
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, dtype=GAZE_DTYPE, delimiter=",", usecols=columns, ndmin=1)
+            if len(chunk):
+                yield chunk
+
+
+def count_rows(csv_path: str, block_size: int = 1 << 24) -> int:
+    """Count the data rows (lines after the header) without parsing them."""
+    newlines = 0
+    last_byte = b"\n"
+    with open(csv_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            newlines += block.count(b"\n")
+            last_byte = block[-1:]
+    lines = newlines + (0 if last_byte == b"\n" else 1)
+    return max(lines - 1, 0)
+
+
+def source_stamp(csv_path: str) -> dict:
+    """The size and modification time that make a sidecar stale when they change."""
+    stat = os.stat(csv_path)
+    return {"version": SIDECAR_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def sidecar_is_fresh(csv_path: str) -> bool:
+    npy_path = sidecar_path(csv_path)
+    try:
+        with open(npy_path + ".json", "r") as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return os.path.exists(npy_path) and stamp == source_stamp(csv_path)
+
+
+def build_sidecar(csv_path: str, chunk_rows: int = 1_000_000) -> str:
+    """
+    Parse the CSV into a .npy sidecar, writing each chunk into a memory-mapped file
+    so files larger than RAM can be converted. Returns the sidecar path.
+    """
+    npy_path = sidecar_path(csv_path)
+    temp_path = npy_path + ".tmp.npy"
+    stamp = source_stamp(csv_path)
+
+    rows = count_rows(csv_path)
+    out = None
+    try:
+        out = np.lib.format.open_memmap(temp_path, mode="w+", dtype=GAZE_DTYPE, shape=(rows,))
+        filled = 0
+        is_sorted = True
+        last_timestamp = np.iinfo(np.int64).min
+        for chunk in iter_gaze_chunks(csv_path, chunk_rows):
+            out[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+            timestamps = chunk["timestamp"]
+            if timestamps[0] < last_timestamp or np.any(timestamps[1:] < timestamps[:-1]):
+                is_sorted = False
+            last_timestamp = timestamps[-1]
+
+        # Blank lines were counted as rows, keep only the parsed ones
+        if filled < rows:
+            trimmed_path = npy_path + ".trim.npy"
+            np.save(trimmed_path, out[:filled])
+            del out
+            os.replace(trimmed_path, temp_path)
+            out = np.load(temp_path, mmap_mode="r+")
+
+        # Lookups binary-search the timestamps, so they must be in order
+        if not is_sorted:
+            out[:] = np.sort(out, order="timestamp", kind="stable")
+
+        out.flush()
+        del out
+        os.replace(temp_path, npy_path)
+    finally:
+        # A failed build leaves no partial files behind, the memmap is closed first so Windows can delete them
+        out = None
+        for path in (temp_path, npy_path + ".trim.npy"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    with open(npy_path + ".json", "w") as f:
+        json.dump(stamp, f)
+    return npy_path
+
+
+def load_gaze(csv_path: str, use_cache: bool = True, chunk_rows: int = 1_000_000) -> np.ndarray:
+    """
+    Load gaze_positions.csv as a GAZE_DTYPE array sorted by timestamp.
+
+    The first open builds the sidecar; later opens memory-map it, unless the CSV
+    changed size or modification time since. Without a writable folder (or with
+    use_cache=False) the CSV is parsed into memory instead.
+    """
+    if use_cache:
+        try:
+            if not sidecar_is_fresh(csv_path):
+                build_sidecar(csv_path, chunk_rows)
+            return np.load(sidecar_path(csv_path), mmap_mode="r")
+        except OSError:  # Read-only or not writable folder
+            pass
+
+    chunks = list(iter_gaze_chunks(csv_path, chunk_rows))
+    gaze = np.concatenate(chunks) if chunks else np.zeros(0, dtype=GAZE_DTYPE)
+    if len(gaze) > 1 and np.any(gaze["timestamp"][1:] < gaze["timestamp"][:-1]):
+        gaze = np.sort(gaze, order="timestamp", kind="stable")
+    return gaze
+
+
+class GazeIndex:
+    """
+    Look up gaze samples by video position with binary search over the sorted
+    timestamps, O(log n) per lookup however long the recording is.
+
+    tracker time (ns) = origin_ns + (video position (ms) + offset_ms) * 1e6
+    where origin_ns defaults to the first gaze sample.
+    """
+
+    def __init__(self, gaze: np.ndarray, offset_ms: float = 0.0, origin_ns: int = None, max_gap_ms: float = 100.0):
+        self.gaze = gaze
+        self.timestamps = np.ascontiguousarray(gaze["timestamp"])  # Contiguous for fast searchsorted
+        self.x = gaze["x"]
+        self.y = gaze["y"]
+        self.offset_ms = offset_ms
+        self.origin_ns = int(self.timestamps[0]) if origin_ns is None and len(gaze) else int(origin_ns or 0)
+        self.max_gap_ms = max_gap_ms  # No gaze is shown farther than this from a sample (dropouts, blinks)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def to_tracker_ns(self, position_ms: float) -> int:
+        return self.origin_ns + int(round((position_ms + self.offset_ms) * 1e6))
+
+    def to_video_ms(self, timestamp_ns) -> float:
+        return (np.asarray(timestamp_ns) - self.origin_ns) / 1e6 - self.offset_ms
+
+    def index_at(self, position_ms: float):
+        """The index of the sample nearest to the video position, or None in a gap."""
+        if not len(self.timestamps):
+            return None
+        t = self.to_tracker_ns(position_ms)
+        i = int(np.searchsorted(self.timestamps, t))
+        # Pick the nearer of the two neighbours
+        if i == len(self.timestamps) or (i > 0 and t - self.timestamps[i - 1] <= self.timestamps[i] - t):
+            i -= 1
+        if abs(int(self.timestamps[i]) - t) > self.max_gap_ms * 1e6:
+            return None
+        return i
+
+    def gaze_at(self, position_ms: float):
+        """The (x, y) in scene camera pixels at the video position, or None."""
+        i = self.index_at(position_ms)
+        if i is None:
+            return None
+        return float(self.x[i]), float(self.y[i])
+
+    def window(self, position_ms: float, trailing_ms: float) -> slice:
+        """The samples from trailing_ms before the video position up to it, as a slice."""
+        end_ns = self.to_tracker_ns(position_ms)
+        start_ns = end_ns - int(trailing_ms * 1e6)
+        start, end = np.searchsorted(self.timestamps, [start_ns, end_ns], side="right")
+        return slice(int(start), int(end))
+
+    def trail(self, position_ms: float, trailing_ms: float):
+        """The x and y arrays of the trailing window, views into the gaze data."""
+        s = self.window(position_ms, trailing_ms)
+        return self.x[s], self.y[s]
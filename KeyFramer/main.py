@@ -10,19 +10,75 @@ from PyQt6.QtWidgets import (
     QSizePolicy, QFileDialog, QSlider, QInputDialog,
     QListWidget, QListWidgetItem, QMessageBox
 )
-from PyQt6.QtGui import QKeySequence
-from PyQt6.QtCore import Qt, QUrl
+from PyQt6.QtGui import QKeySequence, QPainter, QColor, QPen, QBrush
+from PyQt6.QtCore import Qt, QUrl, QPointF, QEvent
 from PyQt6.QtMultimedia import QMediaPlayer
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 
-# Helper function to format time in hh:mm:ss.mmm
-# This uses ms-based timing, does not rely on frame rates.
-def format_time(ms: int) -> str:
-    hours = ms // 3600000
-    minutes = (ms % 3600000) // 60000
-    seconds = (ms % 60000) // 1000
-    millis = ms % 1000
-    return f"{hours:02}:{minutes:02}:{seconds:02}.{millis:03}"  # hh:mm:ss.mmm
+from gaze_data import load_gaze, GazeIndex
+from session_io import format_time, SESSION_HEADER
+
+# Scene camera size used to place the gaze when OpenCV cannot read the video size
+DEFAULT_SCENE_SIZE = (1600, 1200)
+
+
+class GazeOverlay(QWidget):
+    """
+    Transparent widget on top of the video that draws the current gaze point
+    and a fading trail of the samples before it.
+    """
+
+    def __init__(self, video_widget):
+        super().__init__(video_widget)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+
+        self.scene_size = DEFAULT_SCENE_SIZE  # Size of the frame the gaze pixels refer to
+        self.point = None  # Current gaze (x, y) in scene pixels, None when no gaze
+        self.trail_x = ()
+        self.trail_y = ()
+
+        # Follow the size of the video widget
+        video_widget.installEventFilter(self)
+        self.setGeometry(video_widget.rect())
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Resize:
+            self.setGeometry(obj.rect())
+        return False
+
+    def set_gaze(self, point, trail_x, trail_y):
+        self.point = point
+        self.trail_x = trail_x
+        self.trail_y = trail_y
+        self.update()
+
+    def to_widget(self, x, y):
+        """Map scene pixels to widget pixels, the video is letterboxed to keep its aspect ratio."""
+        scene_w, scene_h = self.scene_size
+        scale = min(self.width() / scene_w, self.height() / scene_h)
+        left = (self.width() - scene_w * scale) / 2
+        top = (self.height() - scene_h * scale) / 2
+        return QPointF(left + x * scale, top + y * scale)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+
+        # Older samples are more transparent
+        count = len(self.trail_x)
+        for i in range(count):
+            alpha = int(40 + 140 * (i + 1) / count)
+            painter.setBrush(QBrush(QColor(255, 200, 0, alpha)))
+            painter.drawEllipse(self.to_widget(float(self.trail_x[i]), float(self.trail_y[i])), 3, 3)
+
+        if self.point is not None:
+            painter.setPen(QPen(QColor(255, 0, 0), 3))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawEllipse(self.to_widget(*self.point), 15, 15)
+        painter.end()
 
 
 class MainWindow(QMainWindow):
@@ -45,6 +101,11 @@ class MainWindow(QMainWindow):
         # Keep track of the video's actual FPS (retrieved via OpenCV)
         self.video_fps = None
 
+        # Gaze data of the video, looked up at every position change
+        self.gaze_index = None
+        self.gaze_offset_ms = 0.0  # Video-to-tracker offset, tracker time = video time + offset
+        self.gaze_trail_ms = 500  # Length of the trailing gaze window drawn behind the current point
+
         # Ensure "KeyFramer Sessions" folder exists
         self.sessions_folder = os.path.join(os.getcwd(), "KeyFramer Sessions")
         os.makedirs(self.sessions_folder, exist_ok=True)
@@ -102,6 +163,8 @@ class MainWindow(QMainWindow):
             QSizePolicy.Policy.Expanding,
             QSizePolicy.Policy.Expanding
         )
+        self.gaze_overlay = GazeOverlay(self.player_widget)
+        self.gaze_overlay.hide()  # Shown once gaze data is loaded
 
         # Timeline with playhead
         self.timeline_layout = QVBoxLayout()
@@ -245,10 +308,18 @@ class MainWindow(QMainWindow):
         toggle_keyframes_btn = QPushButton("Toggle KeyFrames")
         toggle_keyframes_btn.clicked.connect(self.toggle_keyframes_panel)
 
+        load_gaze_btn = QPushButton("Load Gaze")
+        load_gaze_btn.clicked.connect(self.load_gaze_data)
+
+        gaze_offset_btn = QPushButton("Gaze Offset")
+        gaze_offset_btn.clicked.connect(self.set_gaze_offset)
+
         toolbar.addWidget(open_video_btn)
         toolbar.addWidget(toggle_sessions_btn)
         toolbar.addWidget(toggle_aois_btn)
         toolbar.addWidget(toggle_keyframes_btn)
+        toolbar.addWidget(load_gaze_btn)
+        toolbar.addWidget(gaze_offset_btn)
 
         # Refresh session list at startup
         self.refresh_session_list()
@@ -345,7 +416,7 @@ class MainWindow(QMainWindow):
             if not os.path.exists(csv_path):
                 with open(csv_path, "w", newline="") as csv_file:
                     writer = csv.writer(csv_file)
-                    writer.writerow(["AOI", "In Time", "Duration", "Out Time"])
+                    writer.writerow(SESSION_HEADER)
             self.refresh_session_list()
 
     #############################
@@ -500,6 +571,12 @@ class MainWindow(QMainWindow):
                 self.video_fps = cap.get(cv2.CAP_PROP_FPS)
                 if self.video_fps <= 1e-2:  # fallback if invalid or 0
                     self.video_fps = None
+
+                # The gaze pixels refer to the frame size of the scene video
+                frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                if frame_w > 0 and frame_h > 0:
+                    self.gaze_overlay.scene_size = (frame_w, frame_h)
                 cap.release()
             else:
                 self.video_fps = None
@@ -523,6 +600,49 @@ class MainWindow(QMainWindow):
             frame_num = 0
 
         self.time_label.setText(f"{time_text} | Frame: {frame_num}")
+        self.update_gaze_overlay(position)
+
+    ###################
+    # Gaze methods    #
+    ###################
+    def load_gaze_data(self):
+        """Load a gaze_positions.csv; the first load caches it next to the CSV for fast reopening."""
+        gaze_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Open Gaze Data",
+            "",
+            "Gaze Data (*.csv)"
+        )
+        if not gaze_path:
+            return
+        try:
+            gaze = load_gaze(gaze_path)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Gaze Data", str(e))
+            return
+
+        self.gaze_index = GazeIndex(gaze, self.gaze_offset_ms)
+        self.gaze_overlay.show()
+        self.gaze_overlay.raise_()
+        self.update_gaze_overlay(self.media_player.position())
+
+    def set_gaze_offset(self):
+        offset_ms, ok = QInputDialog.getDouble(
+            self, "Gaze Offset", "Tracker time minus video time (ms):",
+            self.gaze_offset_ms, -3600000.0, 3600000.0, 1
+        )
+        if ok:
+            self.gaze_offset_ms = offset_ms
+            if self.gaze_index is not None:
+                self.gaze_index.offset_ms = offset_ms
+                self.update_gaze_overlay(self.media_player.position())
+
+    def update_gaze_overlay(self, position):
+        """Binary-search the gaze at the playhead and its trailing window, O(log n) per frame."""
+        if self.gaze_index is None:
+            return
+        trail_x, trail_y = self.gaze_index.trail(position, self.gaze_trail_ms)
+        self.gaze_overlay.set_gaze(self.gaze_index.gaze_at(position), trail_x, trail_y)
 
     def set_slider_range(self, duration):
         self.timeline_slider.setRange(0, duration)
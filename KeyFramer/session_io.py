@@ -0,0 +1,38 @@
+import csv
+
+# Header of every session CSV in the KeyFramer Sessions folder
+SESSION_HEADER = ["AOI", "In Time", "Duration", "Out Time"]
+
+
+# Helper function to format time in hh:mm:ss.mmm
+# This uses ms-based timing, does not rely on frame rates.
+def format_time(ms: int) -> str:
+    hours = ms // 3600000
+    minutes = (ms % 3600000) // 60000
+    seconds = (ms % 60000) // 1000
+    millis = ms % 1000
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{millis:03}"  # hh:mm:ss.mmm
+
+
+def parse_time(text: str) -> int:
+    """Inverse of format_time: hh:mm:ss.mmm (or a plain number of ms) to ms."""
+    text = text.strip()
+    if ":" not in text:
+        return int(round(float(text)))
+    hours, minutes, seconds = text.split(":")
+    return int(hours) * 3600000 + int(minutes) * 60000 + int(round(float(seconds) * 1000))
+
+
+def read_aoi_names(aoi_file: str) -> list:
+    """AOI.csv holds one AOI name per line."""
+    with open(aoi_file, "r", newline="") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_session_csv(session_path: str, keyframes) -> None:
+    """Write (AOI, in ms, out ms) keyframes as a session CSV, replacing the file."""
+    with open(session_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(SESSION_HEADER)
+        for aoi, in_ms, out_ms in keyframes:
+            writer.writerow([aoi, format_time(in_ms), format_time(out_ms - in_ms), format_time(out_ms)])
@@ -0,0 +1,220 @@
+# the asyncio data input interfaces, several connections on one event loop
+
+# internal libraries
+from clock import clock_now # monotonic packet times
+
+# external libraries
+import asyncio # event loop
+import struct # length-prefixed framing
+import threading # event loop thread
+from collections import deque # received packet queue
+
+
+LENGTH_PREFIX = struct.Struct("!I") # the 4 byte big-endian length in front of each TCP message
+
+
+
+class AsyncDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    the UDP protocol that timestamps every datagram at arrival and hands it to its connection
+    """
+
+    def __init__(self, conn_obj):
+        self.conn = conn_obj
+
+
+    def datagram_received(self, data, addr):
+        self.conn.conn_packet(data, addr, clock_now())
+
+
+    def error_received(self, exc):
+        print(f"{self.conn.conn_name}: {exc}")
+
+
+
+class AsyncConn():
+    """
+    the asyncio connection class to receive from external applications over UDP, or over TCP with line or length-prefixed framing
+    """
+
+    def __init__(self, conn_name, conn_type, conn_ip, conn_port, conn_buffer=1024, framing="line"):
+
+        self.conn_name = str(conn_name) # the name of the channel, e.g. "AOI", "CAN", "gaze"
+        self.conn_type = str(conn_type) # the type of the connection
+        self.conn_ip = str(conn_ip) # the ip address of the connection
+        self.conn_port = int(conn_port) # the port of the connection
+        self.conn_buffer = int(conn_buffer) # the largest TCP message accepted
+        self.framing = str(framing) # the TCP framing, "line" = newline terminated, "length" = 4 byte length prefix
+
+        if self.conn_type not in ("TCP", "UDP"):
+            raise ValueError(f"Protocol not supported: {self.conn_type}")
+        if self.framing not in ("line", "length"):
+            raise ValueError(f"Framing not supported: {self.framing}")
+
+        self.on_packet = None # called with (conn_name, data, addr, time_received) for every packet
+        self.transport = None # the UDP transport
+        self.server = None # the TCP server
+        self.clients = set() # the writers of the connected TCP clients
+
+
+    def conn_packet(self, data, addr, time_received):
+        if self.on_packet is not None:
+            self.on_packet(self.conn_name, data, addr, time_received)
+
+
+    async def conn_start(self):
+
+        loop = asyncio.get_running_loop()
+
+        if self.conn_type == "UDP":
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: AsyncDatagramProtocol(self), local_addr=(self.conn_ip, self.conn_port))
+        else:
+            self.server = await asyncio.start_server(self.conn_client, self.conn_ip, self.conn_port, limit=self.conn_buffer)
+
+
+    async def conn_client(self, reader, writer):
+
+        # receive the framed messages of one TCP client until it disconnects
+        addr = writer.get_extra_info("peername")
+        self.clients.add(writer)
+
+        try:
+            while True:
+                if self.framing == "line":
+                    data = await reader.readuntil(b"\n")
+                else:
+                    length, = LENGTH_PREFIX.unpack(await reader.readexactly(LENGTH_PREFIX.size))
+                    if length > self.conn_buffer:
+                        print(f"{self.conn_name}: message of {length} bytes exceeds the buffer, connection closed")
+                        break
+                    data = await reader.readexactly(length)
+
+                self.conn_packet(data, addr, clock_now())
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass # the client disconnected or sent an oversized line
+
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+    def conn_close(self):
+
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+        for writer in list(self.clients): # the readers of the clients end at EOF
+            writer.close()
+
+
+
+class AsyncConnGroup():
+    """
+    the group of asyncio connections that share one event loop and one packet queue
+    """
+
+    def __init__(self, queue_size=65536):
+
+        self.conns = [] # the connections of the group
+        self.queue_size = int(queue_size) # the maximum number of packets waiting for the consumer
+        self.recv_queue = deque() # (conn_name, data, addr, time_received) of every received packet
+        self.dropped_packets = 0 # the number of packets dropped because the queue was full
+
+        self.loop = None
+        self.loop_thread = None
+
+
+    def add_conn(self, conn_obj):
+
+        conn_obj.on_packet = self.conn_packet
+        self.conns.append(conn_obj)
+
+        return conn_obj
+
+
+    def conn_packet(self, conn_name, data, addr, time_received):
+
+        if len(self.recv_queue) >= self.queue_size:
+            self.dropped_packets += 1
+            return
+
+        self.recv_queue.append((conn_name, data, addr, time_received))
+
+
+    async def conn_start(self):
+
+        for conn_obj in self.conns:
+            await conn_obj.conn_start()
+
+
+    def recv_start(self):
+
+        # run the event loop of the group on its own thread
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        start_error = [] # the exception of a connection that failed to start, e.g. a port already bound
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self.conn_start())
+            except Exception as e:
+                start_error.append(e)
+            else:
+                started.set()
+                self.loop.run_forever()
+
+            # close the connections on the loop, so the transports run their close callbacks and release the sockets
+            self.loop.run_until_complete(self.conn_stop())
+            started.set() # after a failed start only once the connections are closed
+
+        self.loop_thread = threading.Thread(target=run_loop, name="async conn group", daemon=True)
+        self.loop_thread.start()
+        started.wait()
+
+        if start_error:
+            # the connections that did start are closed by the loop thread, raise on the calling thread
+            self.loop_thread.join()
+            self.loop.close()
+            self.loop = None
+            raise start_error[0]
+
+
+    async def conn_stop(self):
+
+        for conn_obj in self.conns:
+            conn_obj.conn_close()
+
+        # wait for the handlers of the TCP clients, which end once their connection is closed
+        clients = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*clients, return_exceptions=True)
+
+        await asyncio.sleep(0) # one more pass of the loop for the close callbacks
+
+
+    def recv_pending(self, max_packets=None):
+
+        # take every packet received so far, oldest first, without blocking
+        packets = []
+        while self.recv_queue and (max_packets is None or len(packets) < max_packets):
+            packets.append(self.recv_queue.popleft())
+
+        return packets
+
+
+    def recv_stop(self):
+
+        if self.loop is None:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop) # the loop thread closes the connections once the loop stopped
+        self.loop_thread.join()
+        self.loop.close()
+        self.loop = None
@@ -0,0 +1,83 @@
+# low-latency warning sounds, decoded once and played from memory
+
+# internal libraries used
+from clock import clock_now # play call timing
+
+# external libraries used
+import pygame # warning sound
+import os # filepath
+
+
+
+class SoundBank():
+    """
+    the warning sounds decoded once into PCM at startup, each played on its own reserved mixer channel
+    """
+
+    def __init__(self, frequency=44100, buffer_size=256, channel_count=8):
+
+        self.frequency = int(frequency) # the sample rate of the mixer
+        self.buffer_size = int(buffer_size) # the mixer buffer in samples, smaller = lower latency but more risk of dropouts
+        self.channel_count = int(channel_count) # the largest number of sounds playing at once
+
+        # the default mixer buffer is large, so restart the mixer with the small one
+        if pygame.mixer.get_init():
+            pygame.mixer.quit()
+        pygame.mixer.init(self.frequency, -16, 2, self.buffer_size)
+        pygame.mixer.set_num_channels(self.channel_count)
+
+        self.sounds = {} # name -> (Sound, Channel)
+
+
+    def sound_load(self, name, sound_path):
+
+        # decode the file (wav, ogg or mp3) into PCM once and reserve a channel for it
+        if name in self.sounds:
+            return
+
+        if len(self.sounds) >= self.channel_count:
+            raise ValueError(f"No free mixer channel for the sound {name}")
+
+        sound = pygame.mixer.Sound(os.path.expanduser(sound_path))
+        channel = pygame.mixer.Channel(len(self.sounds))
+        self.sounds[name] = (sound, channel)
+
+        pygame.mixer.set_reserved(len(self.sounds)) # keep the channel for this sound only
+
+
+    def sound_play(self, name, loops=0):
+        sound, channel = self.sounds[name]
+        channel.play(sound, loops)
+
+
+    def sound_stop(self, name):
+        self.sounds[name][1].stop()
+
+
+    def sound_latency(self, repeat=20):
+
+        # the time the play call takes, measured silently, plus the time one mixer buffer adds before the output;
+        # the latency of the sound card driver comes on top and needs a loopback measurement
+        frequency, _, _ = pygame.mixer.get_init()
+        buffer_ms = self.buffer_size / frequency * 1000
+
+        play_ms = []
+        for sound, channel in self.sounds.values():
+            volume = sound.get_volume()
+            sound.set_volume(0.0)
+            for _ in range(repeat):
+                start = clock_now()
+                channel.play(sound)
+                play_ms.append((clock_now() - start) * 1000)
+                channel.stop()
+            sound.set_volume(volume)
+
+        play_ms.sort()
+        median_play_ms = play_ms[len(play_ms) // 2] if play_ms else 0.0
+
+        return {
+            "frequency": frequency,
+            "buffer_ms": buffer_ms,
+            "play_call_ms": median_play_ms,
+            "estimated_output_ms": median_play_ms + buffer_ms,
+        }
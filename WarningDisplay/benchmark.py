@@ -0,0 +1,321 @@
+# benchmarks of the warning display pipeline, written as JSON to track regressions between releases
+
+# internal libraries used
+from input import * # data stream and payload parsers
+from logger import * # info logging
+from latency import LatencyRecorder # packet-to-decision latency
+from warning_dispatch import * # decisions
+from engine_server import engine_loop # the headless decision loop
+from udp_replay import UDPReplayer, synthetic_aoi_stream # synthetic load
+from regression import run_checks # correctness of the optimized decisions
+from clock import clock_now # monotonic timing
+
+# external libraries used
+import tkinter as tk
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+
+
+class NullLogger():
+    """
+    the logger that discards every record, so that only the decisions are timed
+    """
+
+    def log_data_received(self, data, time_received, state=None):
+        pass
+
+
+    def log_info(self, info, warning_type, state=None):
+        pass
+
+
+
+class NullWarning():
+    """
+    the warning output that does nothing, so that only the decisions are timed
+    """
+
+    def warning_event(self, event, state=None):
+        pass
+
+
+
+def local_conn():
+
+    # a UDP connection on a free localhost port
+    conn_object = Conn("UDP", "127.0.0.1", 0, 1024)
+    conn_object.conn_sock()
+    conn_object.conn_connect()
+
+    return conn_object, conn_object.conn_socket.getsockname()[1]
+
+
+def synthetic_decisions(samples, rate=60.0, seed=1):
+
+    # the parsed AOI values and times of a synthetic stream, as the dispatcher receives them
+    parser = AOIFlagParser()
+    packets = synthetic_aoi_stream(samples / rate, rate, seed=seed)[:samples]
+
+    return [parser.parse(payload) for _, payload in packets], [packet_time for packet_time, _ in packets]
+
+
+def bench_aoi_parser(packets=100000, repeat=5):
+
+    # compare copying and slicing each packet as refresh_both_warning did with the in-place parser
+    payloads = [b"AOI_road\ttrue\n" if index % 3 else b"AOI_road\tfalse\n" for index in range(packets)]
+    batch = PacketBatch(packets, 32)
+    for payload in payloads:
+        batch.buffer[batch.size:batch.size + len(payload)] = payload
+        batch.offsets.append(batch.size)
+        batch.lengths.append(len(payload))
+        batch.truncated.append(0)
+        batch.size += len(payload)
+
+    parser = AOIFlagParser()
+
+    def slicing():
+        for offset, length in zip(batch.offsets, batch.lengths):
+            bytes(batch.view[offset:offset + length]).decode("utf-8")[-6:-1].strip()
+
+    def in_place():
+        parser.parse_batch(batch)
+
+    results = {}
+    for name, function in (("decode and slice", slicing), ("AOIFlagParser", in_place)):
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        results[name] = packets / best
+
+    return results
+
+
+def bench_conn_parse(packets=200000, rate=1000.0):
+
+    # packets per second received and parsed by Conn.recv_many while a second thread sends as fast as possible
+    conn_object, conn_port = local_conn()
+    conn_object.conn_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304)
+
+    replayer = UDPReplayer("127.0.0.1", conn_port)
+    stream = synthetic_aoi_stream(packets / rate, rate, seed=1)[:packets]
+    sender = threading.Thread(target=replayer.replay, args=(stream, 0), daemon=True)
+
+    parser = AOIFlagParser()
+    batch = None
+    received = 0
+
+    start = clock_now()
+    sender.start()
+    while True:
+        batch = conn_object.recv_many(256, 0.1, batch)
+        parser.parse_batch(batch)
+        received += len(batch)
+
+        if not len(batch) and not sender.is_alive():
+            break
+
+    elapsed = clock_now() - start - 0.1 # the last, empty wait
+    conn_object.conn_socket.close()
+
+    return {
+        "sent": replayer.sent_packets,
+        "received": received,
+        "lost": replayer.sent_packets - received,
+        "packets_per_second": received / elapsed,
+    }
+
+
+def bench_decisions(samples=200000, repeat=3, use_tk=False):
+
+    # decisions per second of the state machine alone and of the dispatcher, or with Tk of WarningDisplay.warning
+    values, times = synthetic_decisions(samples)
+    results = {}
+
+    def engine_step():
+        engine = WarningEngine(0.160, 3.0)
+        for data, time_received in zip(values, times):
+            engine.step(data, time_received)
+
+    def dispatcher_dispatch():
+        dispatcher = WarningDispatcher(NullLogger())
+        dispatcher.add_channel(NullWarning(), 0.160, 3.0)
+        dispatcher.add_channel(NullWarning(), 0.160, 3.5)
+        dispatcher.dispatch_in_order(values, times)
+
+    functions = [] if use_tk else [("WarningEngine.step", engine_step), ("WarningDispatcher.dispatch", dispatcher_dispatch)]
+
+    if use_tk:
+        try:
+            root = tk.Tk()
+        except tk.TclError as error:
+            results["WarningDisplay.warning"] = {"skipped": str(error)}
+            root = None
+
+        if root is not None:
+            from warning_display import WarningDisplay # needs Pillow and a display
+            from visual import WarningCanvas
+
+            canvas = WarningCanvas(root)
+            display = WarningDisplay("Visual", None)
+            display.warning_init("icon.png", 0.160, 3.0, NullLogger(), canvas=canvas)
+
+            def display_warning():
+                display.engine.engine_reset()
+                for data, time_received in zip(values, times):
+                    display.warning(data, time_received)
+                root.update() # draw what the decisions changed
+
+            functions.append(("WarningDisplay.warning", display_warning))
+
+    for name, function in functions:
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        results[name] = {"decisions_per_second": samples / best}
+
+    if use_tk and root is not None:
+        root.destroy()
+
+    return results
+
+
+def bench_logger(records=100000):
+
+    # records per second of every logger, including writing the remaining records at the end
+    values, times = synthetic_decisions(records)
+    results = {}
+
+    loggers = (
+        ("Logger", Logger, records // 20), # opens the file for every record, so fewer records
+        ("BufferedLogger", BufferedLogger, records),
+        ("AsyncLogger", AsyncLogger, records),
+        ("BinaryLogger", BinaryLogger, records),
+    )
+
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as log_directory:
+        os.chdir(log_directory) # the loggers write to the working directory
+        try:
+            for name, logger_class, count in loggers:
+                logger_obj = logger_class()
+                logger_obj.create_timestamp()
+
+                start = clock_now()
+                for data, time_received in zip(values[:count], times[:count]):
+                    logger_obj.log_data_received(data, time_received, 0)
+                enqueued = clock_now() - start
+
+                if hasattr(logger_obj, "log_close"):
+                    logger_obj.log_close()
+                elapsed = clock_now() - start
+
+                results[name] = {
+                    "records": count,
+                    "records_per_second": count / elapsed,
+                    "call_records_per_second": count / enqueued, # the rate seen by the caller
+                }
+                if hasattr(logger_obj, "log_stats"):
+                    results[name]["dropped"] = logger_obj.log_stats()["dropped_records"]
+        finally:
+            os.chdir(working_directory)
+
+    return results
+
+
+def bench_packet_to_decision(duration=5.0, rate=1000.0, use_tk=False):
+
+    # the time from packet arrival to the decision under synthetic load sent in real time over localhost,
+    # in the headless engine loop or through ConnReceiver and the Tk loop as in main.py
+    conn_object, conn_port = local_conn()
+    latency_obj = LatencyRecorder()
+
+    dispatcher = WarningDispatcher(NullLogger(), latency_obj)
+    dispatcher.add_channel(NullWarning(), 0.160, 3.0)
+    dispatcher.add_channel(NullWarning(), 0.160, 3.5)
+
+    replayer = UDPReplayer("127.0.0.1", conn_port)
+    stream = synthetic_aoi_stream(duration, rate, seed=1)
+    sender = threading.Thread(target=replayer.replay, args=(stream, 1.0), daemon=True)
+
+    if not use_tk:
+        end_time = clock_now() + duration + 0.5
+        sender.start()
+        engine_loop(conn_object, AOIFlagParser(), dispatcher, running=lambda: clock_now() < end_time)
+
+    else:
+        try:
+            root = tk.Tk()
+        except tk.TclError as error:
+            conn_object.conn_socket.close()
+            return {"skipped": str(error)}
+
+        receiver_object = ConnReceiver(conn_object, parser=AOIFlagParser(), latency=latency_obj)
+        warning_timer = WarningTimer(root, dispatcher, receiver_object)
+
+        def refresh():
+            dispatcher.dispatch_packets(receiver_object.recv_pending())
+            warning_timer.timer_arm()
+            root.after(5, refresh)
+
+        receiver_object.recv_start()
+        sender.start()
+        root.after(5, refresh)
+        root.after(int((duration + 0.5) * 1000), root.quit)
+        root.mainloop()
+
+        receiver_object.recv_stop()
+        root.destroy()
+
+    sender.join()
+    conn_object.conn_socket.close()
+
+    summary = latency_obj.latency_summary()
+    results = {stage: summary[stage] for stage in ("parse", "decide") if summary[stage]["count"]}
+    results["sent"] = replayer.sent_packets
+    results["max_send_lateness_ms"] = replayer.max_lateness * 1000
+
+    return results
+
+
+def run_benchmarks(use_tk=False, quick=False):
+
+    scale = 10 if quick else 1
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "aoi_parser_packets_per_second": bench_aoi_parser(100000 // scale),
+        "conn_parse": bench_conn_parse(200000 // scale),
+        "decisions": bench_decisions(200000 // scale),
+        "logger": bench_logger(100000 // scale),
+        "packet_to_decision": bench_packet_to_decision(5.0 / scale),
+        "regression": run_checks(quick), # timings of logic that stopped matching the step-by-step runs mean nothing
+    }
+
+    if use_tk:
+        results["decisions_tk"] = bench_decisions(200000 // scale, use_tk=True)
+        results["packet_to_decision_tk"] = bench_packet_to_decision(5.0 / scale, use_tk=True)
+
+    return results
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the warning display pipeline and write the results as JSON.")
+    parser.add_argument("--output", default=None, help="the JSON file to write, stdout by default")
+    parser.add_argument("--tk", action="store_true", help="also run the benchmarks with Tk attached (needs a display)")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the load, for a smoke test")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.tk, args.quick)
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as results_file:
+            json.dump(results, results_file, indent=2)
@@ -0,0 +1,17 @@
+# the clock of the warning pipeline: a monotonic clock for the decisions,
+# converted to the system time only when written to the log
+
+# external libraries
+import time
+
+
+# the system time at clock time 0, taken once so that the log times never jump
+CLOCK_TO_UNIX = time.time() - time.perf_counter()
+
+
+def clock_now():
+    return time.perf_counter() # monotonic too, but with the resolution that time.monotonic lacks on Windows before Python 3.13
+
+
+def clock_to_unix(monotonic_time):
+    return monotonic_time + CLOCK_TO_UNIX
@@ -0,0 +1,132 @@
+# the display client of the headless warning engine: only shows the icons and plays the sounds
+
+# internal libraries used
+from input import * # warning messages
+from audio import * # preloaded warning sounds
+from visual import * # render-once warning icons
+
+# external libraries used
+import tkinter as tk
+import argparse
+import os # filepath
+import time # delivery delay of the messages
+
+
+# the files shown as icons by --warning, any other file is played as a sound
+ICON_EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg", ".bmp")
+
+
+
+class DisplayClient(tk.Tk):
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+
+        self.title("Warning Display Client") # set the title of the frame
+        self.geometry("720x480") # set the size of the frame
+        self.configure(bg="black")
+
+        self.outputs = {} # warning type -> (start, stop)
+        self.unknown_types = set() # the warning types received without an output, reported once each
+        self.warning_canvas = None # one canvas for every icon, created with the first one
+        self.sound_bank = None # one bank for every sound, created with the first one
+        self.delivery_delays = [] # the time (s) from the engine sending a message to the client receiving it
+
+
+    def create_conn(self, conn_ip, conn_port):
+
+        self.conn_object = Conn("UDP", conn_ip, conn_port, 1024)
+        self.conn_object.conn_sock()
+        self.conn_object.conn_connect()
+
+        self.receiver_object = ConnReceiver(self.conn_object)
+        self.receiver_object.recv_start()
+
+
+    def create_visual_warning(self, warning_type, icon_path):
+
+        if self.warning_canvas is None:
+            self.warning_canvas = WarningCanvas(self)
+        self.warning_canvas.icon_add(warning_type, os.path.expanduser(icon_path))
+        self.outputs[warning_type] = (lambda: self.warning_canvas.icon_show(warning_type),
+                                      lambda: self.warning_canvas.icon_hide(warning_type))
+
+
+    def create_auditory_warning(self, warning_type, sound_path):
+
+        if self.sound_bank is None:
+            self.sound_bank = SoundBank()
+        self.sound_bank.sound_load(warning_type, sound_path)
+        self.outputs[warning_type] = (lambda: self.sound_bank.sound_play(warning_type),
+                                      lambda: self.sound_bank.sound_stop(warning_type))
+
+
+    def create_warning(self, warning_type, path):
+
+        # an icon or a sound for any warning type, e.g. the name of a rule of engine_server.py --rules
+        if os.path.splitext(path)[1].lower() in ICON_EXTENSIONS:
+            self.create_visual_warning(warning_type, path)
+        else:
+            self.create_auditory_warning(warning_type, path)
+
+
+    def refresh_warning(self):
+
+        # messages are "{warning type},{on/off},{system time}" from NetworkWarning
+        for (data, _), _ in self.receiver_object.recv_pending():
+            try:
+                warning_type, state, time_sent = data.decode("utf-8").strip().rsplit(",", 2) # rule names may hold commas
+            except ValueError:
+                continue
+
+            if warning_type not in self.outputs:
+                if warning_type not in self.unknown_types:
+                    self.unknown_types.add(warning_type)
+                    print(f"No output for the warning type {warning_type!r}, add one with --warning \"{warning_type}=icon.png\"")
+                continue
+
+            start, stop = self.outputs[warning_type]
+            if state == "on":
+                start()
+            else:
+                stop()
+            self.delivery_delays.append(time.time() - float(time_sent))
+
+        self.after(2, self.refresh_warning)
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Show the warnings published by engine_server.py.")
+    parser.add_argument("--ip", default="localhost", help="the address the engine sends to")
+    parser.add_argument("--port", type=int, default=20101, help="the port the engine sends to")
+    parser.add_argument("--icon", default="icon.png", help="the icon of the visual warning, empty for none")
+    parser.add_argument("--sound", default="warning.mp3", help="the sound of the auditory warning, empty for none")
+    parser.add_argument("--warning", action="append", default=[], metavar="NAME=FILE",
+                        help="an icon or sound for another warning type, e.g. a rule name with engine_server.py --rules; may be repeated")
+    args = parser.parse_args()
+
+    warnings = []
+    for warning in args.warning:
+        name, separator, path = warning.rpartition("=")
+        if not separator or not name or not path:
+            parser.error(f"--warning needs NAME=FILE: {warning}")
+        warnings.append((name, path))
+
+    main = DisplayClient()
+    main.create_conn(args.ip, args.port)
+
+    if args.icon:
+        main.create_visual_warning("Visual", args.icon)
+    if args.sound:
+        main.create_auditory_warning("Auditory", args.sound)
+    for name, path in warnings:
+        main.create_warning(name, path)
+
+    main.after(2, main.refresh_warning)
+
+    main.mainloop()
+
+    main.receiver_object.recv_stop() # stop receiving
+    if main.delivery_delays:
+        print(f"Delivery delay: max {max(main.delivery_delays) * 1000:.2f} ms over {len(main.delivery_delays)} messages")
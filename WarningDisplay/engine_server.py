@@ -0,0 +1,97 @@
+# the headless warning engine: receive, decide and log in one process, publish the warnings to display clients
+
+# internal libraries used
+from input import * # data stream
+from logger import * # info logging
+from warning_dispatch import * # decisions and network outputs
+from rule_engine import load_rules # multi-AOI rules
+from clock import clock_now # monotonic deadlines
+
+# external libraries used
+import argparse
+
+
+def engine_loop(conn_obj, parser, dispatcher, running=lambda: True, max_packets=256):
+
+    # wait for packets only until the next deadline, so the timeouts fire on time without a GUI loop;
+    # the dispatcher is a WarningDispatcher or a RuleEngine
+    batch = None
+
+    while running():
+        deadline = dispatcher.next_deadline()
+        timeout = 0.2 if deadline is None else max(deadline - clock_now(), 0.0005)
+
+        batch = conn_obj.recv_many(max_packets, timeout, batch)
+        dispatcher.dispatch_in_order(parser.parse_batch(batch), batch.times)
+
+        now = clock_now()
+        deadline = dispatcher.next_deadline()
+        if deadline is not None and now >= deadline:
+            dispatcher.dispatch_expire(now)
+
+
+def parse_address(address):
+
+    conn_ip, conn_port = address.rsplit(":", 1)
+    return conn_ip, int(conn_port)
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the warning engine without a display and publish the warnings over UDP.")
+    parser.add_argument("--ip", default="localhost", help="the address D-Lab sends to")
+    parser.add_argument("--port", type=int, default=20001, help="the port D-Lab sends to")
+    parser.add_argument("--client", action="append", default=None, help="a display client as ip:port, may be repeated")
+    parser.add_argument("--glance", type=float, default=0.160, help="the glance period (s)")
+    parser.add_argument("--visual-warning", type=float, default=3.000, help="the warning period of the visual warning (s)")
+    parser.add_argument("--auditory-warning", type=float, default=3.500, help="the warning period of the auditory warning (s)")
+    parser.add_argument("--binary-log", action="store_true", help="write the binary log alongside the text log")
+    parser.add_argument("--rules", default=None, help="a JSON file of multi-AOI rules, replaces the glance/warning periods")
+    parser.add_argument("--fields", default=None, help="the comma-separated AOI names of each packet, in order, with --rules")
+    args = parser.parse_args()
+
+    clients = [parse_address(client) for client in (args.client or ["localhost:20101"])]
+
+    conn_object = Conn("UDP", args.ip, args.port, 1024)
+    conn_object.conn_sock()
+    conn_object.conn_connect()
+
+    text_logger_obj = AsyncLogger()
+    logger_obj = BinaryLogger(text_logger_obj) if args.binary_log else text_logger_obj
+    logger_obj.create_timestamp()
+
+    def network_output(warning_type):
+
+        # one network output per warning type, each sending to every client
+        output = NetworkWarning(warning_type, *clients[0], logger_obj)
+        for client in clients[1:]:
+            output.add_address(*client)
+
+        return output
+
+    if args.rules is None:
+        payload_parser = AOIFlagParser()
+        dispatcher = WarningDispatcher(logger_obj)
+        for warning_type, warning_period in (("Visual", args.visual_warning), ("Auditory", args.auditory_warning)):
+            dispatcher.add_channel(network_output(warning_type), args.glance, warning_period)
+
+    else:
+        if not args.fields:
+            parser.error("--rules needs --fields")
+
+        # the warning type of each output is the name of its rule
+        payload_parser = FieldParser(args.fields.split(","))
+        dispatcher = load_rules(args.rules, logger_obj)
+        for rule in dispatcher.rules:
+            dispatcher.add_channel(network_output(rule.name), rule.name)
+
+    try:
+        engine_loop(conn_object, payload_parser, dispatcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger_obj.log_close() # write the remaining log records
+        print(f"Logger: {text_logger_obj.log_stats()}")
+        if args.rules is None:
+            print(f"Warning onset: {dispatcher.onset_stats()}")
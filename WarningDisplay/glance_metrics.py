@@ -0,0 +1,232 @@
+# sliding-window glance metrics updated in O(1) per sample, live from the data stream or offline from a binary log
+
+# internal libraries used
+from warning_engine import AOI_TRUE, AOI_FALSE # the AOI flags of the binary log
+
+# external libraries used
+from collections import deque # intervals inside the sliding window
+import argparse
+import csv
+
+
+
+class IntervalWindow():
+    """
+    the intervals of a condition that ended in the last window, with the running sum of their lengths
+    """
+
+    def __init__(self, window):
+
+        self.window = float(window) # the length (s) of the sliding window
+        self.intervals = deque() # the (start, end) of the finished intervals, oldest first
+        self.interval_sum = 0.0 # the total length of the finished intervals
+        self.interval_start = None # the start of the current interval, None = the condition does not hold
+
+
+    def window_start(self, now):
+        if self.interval_start is None:
+            self.interval_start = now
+
+
+    def window_end(self, now):
+
+        if self.interval_start is not None:
+            self.intervals.append((self.interval_start, now))
+            self.interval_sum += now - self.interval_start
+            self.interval_start = None
+
+
+    def window_trim(self, now):
+
+        # drop the intervals that ended before the window, each interval is dropped once
+        cutoff = now - self.window
+        while self.intervals and self.intervals[0][1] <= cutoff:
+            start, end = self.intervals.popleft()
+            self.interval_sum -= end - start
+
+
+    def window_time(self, now):
+
+        # the time the condition held in the last window
+        self.window_trim(now)
+
+        cutoff = now - self.window
+        total = self.interval_sum
+        if self.intervals and self.intervals[0][0] < cutoff: # only the oldest interval can be partly outside
+            total -= cutoff - self.intervals[0][0]
+
+        if self.interval_start is not None:
+            total += now - max(self.interval_start, cutoff)
+
+        return max(total, 0.0)
+
+
+
+class AttenDBuffer():
+    """
+    the AttenD attention buffer: drained while looking away, refilled on the road after a short latency
+    """
+
+    def __init__(self, capacity=2.0, return_latency=0.1, mirror_latency=1.0, decrease_rate=1.0, increase_rate=1.0):
+
+        self.capacity = float(capacity) # the full buffer (s)
+        self.return_latency = float(return_latency) # the time (s) on the road before the buffer refills
+        self.mirror_latency = float(mirror_latency) # the time (s) on a mirror or the speedometer before the buffer drains
+        self.decrease_rate = float(decrease_rate)
+        self.increase_rate = float(increase_rate)
+
+        self.attend_reset(0.0)
+
+
+    def attend_reset(self, now):
+
+        self.value = self.capacity # the buffer at value_time
+        self.value_time = now
+        self.gaze = "road" # "road", "mirror" or "away"
+        self.gaze_time = now # the time the gaze moved to its current target
+
+
+    def attend_value(self, now):
+
+        # the buffer at now, from the last update
+        if self.gaze == "road":
+            start = max(self.value_time, self.gaze_time + self.return_latency)
+            return min(self.value + self.increase_rate * max(now - start, 0.0), self.capacity)
+
+        latency = self.mirror_latency if self.gaze == "mirror" else 0.0
+        start = max(self.value_time, self.gaze_time + latency)
+        return max(self.value - self.decrease_rate * max(now - start, 0.0), 0.0)
+
+
+    def attend_update(self, gaze, now):
+
+        # the gaze moved to "road", "mirror" or "away"
+        self.value = self.attend_value(now)
+        self.value_time = now
+        if gaze != self.gaze:
+            self.gaze = gaze
+            self.gaze_time = now
+
+
+    def attend_empty_time(self):
+
+        # the time the buffer runs out if the gaze stays, None if it does not drain
+        if self.gaze == "road" or self.value <= 0.0:
+            return None
+
+        latency = self.mirror_latency if self.gaze == "mirror" else 0.0
+        return max(self.value_time, self.gaze_time + latency) + self.value / self.decrease_rate
+
+
+    def attend_level_time(self, level):
+
+        # the time the buffer refills above level if the gaze stays on the road, None if it does not refill
+        if self.gaze != "road" or level >= self.capacity:
+            return None
+
+        start = max(self.value_time, self.gaze_time + self.return_latency)
+        return start + max(level - self.value, 0.0) / self.increase_rate
+
+
+
+class GlanceMetrics():
+    """
+    the eyes-off-road time, glance count and mean glance duration of the last window and the AttenD buffer,
+    fed with the same samples as WarningDisplay.warning
+    """
+
+    def __init__(self, window=60.0, attend=None):
+
+        self.off_road = IntervalWindow(window) # the glances away from the road
+        self.attend = AttenDBuffer() if attend is None else attend
+        self.started = False # the metrics start at the first sample
+
+
+    def metrics_update(self, data, time_received):
+
+        # data is "true" inside the road AOI and "false" outside, other values are ignored
+        if not self.started:
+            self.started = True
+            self.attend.attend_reset(time_received)
+
+        if data == "false":
+            self.off_road.window_start(time_received)
+            self.attend.attend_update("away", time_received)
+
+        elif data == "true":
+            self.off_road.window_end(time_received)
+            self.attend.attend_update("road", time_received)
+
+
+    def eyes_off_road_time(self, now):
+        return self.off_road.window_time(now)
+
+
+    def glance_count(self, now):
+
+        # the glances away from the road that ended in the window
+        self.off_road.window_trim(now)
+        return len(self.off_road.intervals)
+
+
+    def mean_glance_duration(self, now):
+
+        self.off_road.window_trim(now)
+        count = len(self.off_road.intervals)
+        return self.off_road.interval_sum / count if count else 0.0
+
+
+    def metrics_summary(self, now):
+
+        return {
+            "eyes_off_road_time": self.eyes_off_road_time(now),
+            "glance_count": self.glance_count(now),
+            "mean_glance_duration": self.mean_glance_duration(now),
+            "attend_buffer": self.attend.attend_value(now),
+        }
+
+
+
+def metrics_series(timestamps, aoi, window=60.0, interval=1.0):
+
+    # the metrics every interval seconds over a recorded session, as from sweep.load_session
+    metrics = GlanceMetrics(window)
+    series = []
+
+    if not len(timestamps):
+        return series
+
+    next_time = float(timestamps[0]) + interval
+    aoi_values = {AOI_TRUE: "true", AOI_FALSE: "false"}
+
+    for time_received, flag in zip(timestamps.tolist(), aoi.tolist()):
+        while time_received >= next_time: # the metrics before the sample, as they were live
+            series.append(dict(time=next_time, **metrics.metrics_summary(next_time)))
+            next_time += interval
+
+        metrics.metrics_update(aoi_values.get(flag), time_received)
+
+    return series
+
+
+
+if __name__ == "__main__":
+
+    from sweep import load_session # binary logs
+
+    parser = argparse.ArgumentParser(description="Compute the sliding-window glance metrics of a binary log.")
+    parser.add_argument("log", help="the binary log of the session")
+    parser.add_argument("--window", type=float, default=60.0, help="the sliding window (s)")
+    parser.add_argument("--interval", type=float, default=1.0, help="the time (s) between two rows")
+    parser.add_argument("--output", default="glance_metrics.csv", help="the CSV file to write")
+    args = parser.parse_args()
+
+    timestamps, aoi = load_session(args.log)
+    series = metrics_series(timestamps, aoi, args.window, args.interval)
+
+    with open(args.output, "w", newline="") as metrics_file:
+        writer = csv.DictWriter(metrics_file, fieldnames=["time", "eyes_off_road_time", "glance_count", "mean_glance_duration", "attend_buffer"])
+        writer.writeheader()
+        writer.writerows(series)
+
+    print(f"{len(series)} rows written to {args.output}")
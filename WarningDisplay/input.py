@@ -1,8 +1,20 @@
 # the data input interfaces
 
+# internal libraries
+from clock import clock_now # monotonic packet times
+
 # external libraries
 import socket # socket for UDP and TCP
-import time
+import threading # receive thread
+import select # wait for data with a timeout
+from array import array # compact packet offsets and timestamps
+from collections import deque # received packet queue
+from abc import ABC, abstractmethod # payload parser interface
+import sys
+
+
+# the flag that makes recvmsg_into return the real size of a datagram larger than the buffer (Linux only)
+RECV_TRUNC_FLAG = socket.MSG_TRUNC if sys.platform.startswith("linux") else 0
 
 
 class Conn():
@@ -16,6 +28,7 @@ class Conn():
         self.conn_ip = str(conn_ip) # the ip address of the connection
         self.conn_port = int(conn_port) # the port of the connection
         self.conn_buffer = int(conn_buffer) # the buffer of connection
+        self.oversized_packets = 0 # the number of datagrams larger than the receive buffer
 
 
     def conn_sock(self):
@@ -40,7 +53,7 @@ class Conn():
 
     def conn_recv(self):
 
-        received_data = self.conn_sock.recvfrom(self.conn_buffer) # receive the information from ther connection
+        received_data = self.conn_socket.recvfrom(self.conn_buffer) # receive the information from ther connection
         
         if not received_data: # if the connection is not established
             return "Connection interrupted"
@@ -51,9 +64,341 @@ class Conn():
     def conn_recv_with_time(self):
 
         received_data = self.conn_socket.recvfrom(self.conn_buffer) # receive the information from ther connection
-        time_received = time.time() # get the time when the UDP data is received
+        time_received = clock_now() # get the time when the UDP data is received
 
         if not received_data: # if the connection is not established
             return "Connection interrupted"
         else:
-            return (received_data, time_received)
\ No newline at end of file
+            return (received_data, time_received)
+
+
+    def conn_recv_into(self, view):
+
+        # receive one datagram into view and detect datagrams that did not fit,
+        # returns the bytes received, the sender and the size of the datagram (at least len(view) + 1 if it did not fit)
+        sock = self.conn_socket
+
+        if hasattr(sock, "recvmsg_into"):
+            # on Linux MSG_TRUNC makes the kernel return the real size of the datagram
+            datagram_size, _, flags, addr = sock.recvmsg_into([view], 0, RECV_TRUNC_FLAG)
+            nbytes = min(datagram_size, len(view))
+            if flags & socket.MSG_TRUNC and datagram_size <= len(view):
+                datagram_size = len(view) + 1
+
+        else: # Windows reports a datagram that did not fit as an error
+            try:
+                nbytes, addr = sock.recvfrom_into(view)
+                datagram_size = nbytes
+            except OSError as error:
+                if getattr(error, "winerror", None) != 10040: # WSAEMSGSIZE
+                    raise
+                nbytes, addr, datagram_size = len(view), None, len(view) + 1
+
+        if datagram_size > nbytes:
+            self.oversized_packets += 1
+
+        return nbytes, addr, datagram_size
+
+
+    def recv_many(self, max_packets=64, timeout=0.0, batch=None):
+
+        # take every datagram queued in the socket, up to max_packets, in one call
+        if batch is None or batch.max_packets < max_packets or batch.packet_size < self.conn_buffer:
+            batch = PacketBatch(max_packets, self.conn_buffer)
+        batch.clear()
+
+        sock = self.conn_socket
+
+        # wait up to timeout for the first datagram
+        if timeout > 0:
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                return batch
+
+        previous_timeout = sock.gettimeout()
+        sock.setblocking(False)
+
+        try:
+            while len(batch.offsets) < max_packets:
+                try:
+                    nbytes, addr, datagram_size = self.conn_recv_into(batch.view[batch.size:batch.size + batch.packet_size])
+                except (BlockingIOError, InterruptedError):
+                    break # the socket is drained
+
+                truncated = datagram_size > nbytes
+                if truncated: # size the next batch for the larger datagrams
+                    conn_buffer = min(max(self.conn_buffer * 2, datagram_size), 65536)
+                    if conn_buffer > self.conn_buffer:
+                        print(f"Datagram of {datagram_size} bytes truncated, the receive buffer grows from {self.conn_buffer} to {conn_buffer} bytes.")
+                        self.conn_buffer = conn_buffer
+
+                batch.times.append(clock_now()) # get the time when the UDP data is received
+                batch.offsets.append(batch.size)
+                batch.lengths.append(nbytes)
+                batch.addrs.append(addr)
+                batch.truncated.append(truncated)
+                batch.size += nbytes
+
+        finally:
+            sock.settimeout(previous_timeout)
+
+        return batch
+
+
+
+class PacketBatch():
+    """
+    the batch of received packets, stored back to back in one buffer with their offsets, lengths and arrival times;
+    the buffer is allocated once and reused by recv_many, and grows with the largest datagram received
+    """
+
+    def __init__(self, max_packets, packet_size):
+
+        self.max_packets = int(max_packets) # the largest number of packets in the batch
+        self.packet_size = int(packet_size) # the largest size of one packet
+        self.buffer = bytearray(self.max_packets * self.packet_size) # the payloads of the packets
+        self.view = memoryview(self.buffer)
+        self.offsets = array("I") # the start of each payload in the buffer
+        self.lengths = array("I") # the length of each payload
+        self.times = array("d") # the arrival time of each packet
+        self.addrs = [] # the sender of each packet
+        self.truncated = array("B") # 1 = the datagram did not fit and only its first bytes were received
+        self.size = 0 # the number of bytes used in the buffer
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def clear(self):
+
+        del self.offsets[:]
+        del self.lengths[:]
+        del self.times[:]
+        self.addrs.clear()
+        del self.truncated[:]
+        self.size = 0
+
+
+    def packet(self, index):
+
+        # the payload of one packet without copying it
+        offset = self.offsets[index]
+        return self.view[offset:offset + self.lengths[index]]
+
+
+    def packets(self, parser=None):
+
+        # the packets in the same format as conn_recv_with_time, with the payload parsed in place if a parser is given;
+        # truncated datagrams are skipped
+        if parser is None:
+            return [((bytes(self.packet(index)), self.addrs[index]), self.times[index])
+                    for index in range(len(self.offsets)) if not self.truncated[index]]
+
+        values = parser.parse_batch(self)
+        return [((value, addr), time_received) for value, addr, time_received, truncated
+                in zip(values, self.addrs, self.times, self.truncated) if not truncated]
+
+
+
+class PayloadParser(ABC):
+    """
+    the base of the payload parsers, which read a packet in place from (buffer, start, end) without copying it
+    """
+
+    @abstractmethod
+    def parse_from(self, buffer, start, end):
+        pass # the parsed value of buffer[start:end]
+
+
+    def parse(self, data):
+        return self.parse_from(data, 0, len(data))
+
+
+    def parse_batch(self, batch):
+
+        # parse every packet of a PacketBatch, None for the truncated ones
+        buffer = batch.buffer
+        return [None if truncated else self.parse_from(buffer, offset, offset + length)
+                for offset, length, truncated in zip(batch.offsets, batch.lengths, batch.truncated)]
+
+
+
+class AOIFlagParser(PayloadParser):
+    """
+    the parser of the D-Lab AOI payload, which ends with "true" or "false" followed by one terminator byte
+    """
+
+    def __init__(self, terminator_size=1):
+        self.terminator_size = int(terminator_size) # the number of bytes after the flag, e.g. "\n"
+
+
+    def parse_from(self, buffer, start, end):
+
+        end -= self.terminator_size
+
+        # compare the end of the payload in place, the returned strings are constants
+        if buffer.endswith(b"true", start, end):
+            return "true"
+        elif buffer.endswith(b"false", start, end):
+            return "false"
+        else:
+            return None
+
+
+    def parse_batch(self, batch):
+
+        # the same comparison as parse_from, inlined for the whole batch
+        buffer = batch.buffer
+        terminator_size = self.terminator_size
+        values = []
+
+        for offset, length, truncated in zip(batch.offsets, batch.lengths, batch.truncated):
+            end = offset + length - terminator_size
+            if truncated:
+                values.append(None)
+            elif buffer.endswith(b"true", offset, end):
+                values.append("true")
+            elif buffer.endswith(b"false", offset, end):
+                values.append("false")
+            else:
+                values.append(None)
+
+        return values
+
+
+
+class FieldParser(PayloadParser):
+    """
+    the parser of multi-field D-Lab payloads, e.g. several AOI flags separated by a delimiter
+    """
+
+    def __init__(self, field_names, delimiter=b"\t", terminator_size=1):
+
+        self.field_names = tuple(field_names) # the names of the fields in the order they are sent
+        self.delimiter = bytes(delimiter) # the bytes between two fields
+        self.terminator_size = int(terminator_size) # the number of bytes after the last field
+
+
+    def parse_field(self, buffer, start, end):
+
+        # convert one field to a typed value, only numbers and text need a copy of their bytes
+        size = end - start
+        if size == 4 and buffer.startswith(b"true", start):
+            return True
+        elif size == 5 and buffer.startswith(b"false", start):
+            return False
+
+        field = bytes(buffer[start:end])
+        try:
+            return float(field)
+        except ValueError:
+            return field.decode("utf-8", "replace")
+
+
+    def parse_from(self, buffer, start, end):
+
+        # find the delimiters in place and return {field name: value}
+        end -= self.terminator_size
+        values = {}
+        field_start = start
+        delimiter_size = len(self.delimiter)
+
+        for name in self.field_names:
+            field_end = buffer.find(self.delimiter, field_start, end)
+            if field_end < 0:
+                field_end = end
+
+            values[name] = self.parse_field(buffer, field_start, field_end)
+
+            if field_end >= end:
+                break
+            field_start = field_end + delimiter_size
+
+        return values
+
+
+
+class ConnReceiver():
+    """
+    the receive thread that drains a connection continuously and timestamps every packet at arrival
+    """
+
+    def __init__(self, conn_obj, queue_size=65536, socket_buffer=4194304, batch_size=256, parser=None, latency=None):
+
+        self.conn = conn_obj # the bound connection to receive from
+        self.queue_size = int(queue_size) # the maximum number of packets waiting for the UI
+        self.socket_buffer = int(socket_buffer) # the requested size of the socket receive buffer
+        self.batch_size = int(batch_size) # the largest number of packets taken from the socket at once
+        self.parser = parser # the payload parser run on the receive thread, None = queue the raw bytes
+        self.latency = latency # the LatencyRecorder of the parse stage, None = not measured
+
+        self.recv_queue = deque() # the received packets in the same format as conn_recv_with_time
+        self.recv_running = False
+        self.recv_thread = None
+
+        self.received_packets = 0 # the number of packets received
+        self.dropped_packets = 0 # the number of packets dropped because the queue was full
+
+
+    def recv_start(self):
+
+        sock = self.conn.conn_socket
+
+        # a larger socket buffer absorbs bursts while the thread is not scheduled
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer)
+        except OSError:
+            pass
+
+        self.recv_running = True
+        self.recv_thread = threading.Thread(target=self.recv_loop, name="conn receiver", daemon=True)
+        self.recv_thread.start()
+
+
+    def recv_loop(self):
+
+        batch = None
+
+        while self.recv_running:
+            try:
+                # drain everything queued in the socket, waking up regularly so that the thread can be stopped
+                batch = self.conn.recv_many(self.batch_size, 0.2, batch)
+            except (OSError, ValueError) as e:
+                if self.recv_running: # not closed by recv_stop, so the receiver must not end silently
+                    print(f"Receive stopped: {e}")
+                    self.recv_running = False
+                break
+
+            packets = batch.packets(self.parser)
+
+            if self.latency is not None:
+                parsed = clock_now()
+                for time_received in batch.times:
+                    self.latency.latency_add("parse", parsed - time_received)
+
+            for packet in packets:
+                if len(self.recv_queue) >= self.queue_size:
+                    self.dropped_packets += 1
+                    continue
+
+                self.recv_queue.append(packet)
+                self.received_packets += 1
+
+
+    def recv_pending(self, max_packets=None):
+
+        # take every packet received so far, oldest first, without blocking
+        packets = []
+        while self.recv_queue and (max_packets is None or len(packets) < max_packets):
+            packets.append(self.recv_queue.popleft())
+
+        return packets
+
+
+    def recv_stop(self):
+
+        self.recv_running = False
+        if self.recv_thread is not None:
+            self.recv_thread.join()
+            self.recv_thread = None
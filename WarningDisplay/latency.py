@@ -0,0 +1,80 @@
+# end-to-end latency of the warning pipeline, from packet arrival to the warning output
+
+# internal libraries used
+from clock import clock_now # monotonic stage times
+
+# external libraries used
+from array import array # compact latency samples
+import json
+
+
+# the stages of the pipeline, each measured from the arrival of the packet (or the deadline for a timer)
+LATENCY_STAGES = (
+    "parse", # the payload was parsed on the receive thread
+    "decide", # the state machines processed the packet
+    "render", # the visual warning call returned
+    "play", # the sound warning call returned
+    "idle", # Tk was idle again after the visual warning, so the icon was drawn
+)
+
+# the upper bounds (ms) of the histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+
+class LatencyRecorder():
+    """
+    the recorder of the time from packet arrival to each stage of the warning pipeline
+    """
+
+    def __init__(self):
+
+        self.samples = {stage: array("d") for stage in LATENCY_STAGES} # the latencies (s) of each stage
+        self.latency_origin = None # the arrival time of the packet being processed, or the deadline of a timer
+
+
+    def latency_add(self, stage, latency):
+        self.samples[stage].append(latency)
+
+
+    def latency_stage(self, stage, origin=None):
+
+        # record that a stage was reached now, measured from origin or the current packet
+        if origin is None:
+            origin = self.latency_origin
+        if origin is not None:
+            self.samples[stage].append(clock_now() - origin)
+
+
+    def latency_summary(self):
+
+        # p50, p99 and max (ms) of every stage and its histogram
+        summary = {}
+
+        for stage, samples in self.samples.items():
+            latencies = sorted(samples)
+            count = len(latencies)
+
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            bucket = 0
+            for latency in latencies: # sorted, so the buckets are filled in order
+                while bucket < len(LATENCY_BUCKETS) and latency * 1000 > LATENCY_BUCKETS[bucket]:
+                    bucket += 1
+                histogram[bucket] += 1
+
+            summary[stage] = {
+                "count": count,
+                "p50_ms": latencies[int(0.50 * (count - 1))] * 1000 if count else None,
+                "p99_ms": latencies[int(0.99 * (count - 1))] * 1000 if count else None,
+                "max_ms": latencies[-1] * 1000 if count else None,
+                "histogram_bounds_ms": list(LATENCY_BUCKETS),
+                "histogram": histogram,
+            }
+
+        return summary
+
+
+    def latency_write(self, path):
+
+        with open(path, "w") as latency_file:
+            json.dump(self.latency_summary(), latency_file, indent=2)
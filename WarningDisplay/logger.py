@@ -1,5 +1,15 @@
+# internal libraries used
+from clock import clock_now, clock_to_unix # packet times are monotonic, the info records use the same clock
+
+# external libraries used
 from datetime import datetime
 import time
+import struct # binary log records
+import os # fsync for the durability policy
+import threading # background log writer
+from collections import deque # log record queue
+
+import numpy as np # memory-mapped binary logs
 
 class Logger():
     
@@ -19,7 +29,8 @@ class Logger():
         self.timestamp = f"{time_year}{time_month}{time_day} {time_hour}_{time_minute}_{time_second}"
 
     
-    def log_data_received(self, data, time_received):
+    def log_data_received(self, data, time_received, state=None):
+        time_received = clock_to_unix(time_received) # the packet time is monotonic, the log uses the system time
         unix_timestamp = ("%.3f" % round(time_received, 3)).replace(".", "")
         local_time = datetime.fromtimestamp(time.mktime(time.localtime(time_received)))
         
@@ -29,11 +40,11 @@ class Logger():
 
 
 
-    def log_info(self, info, warning_type):
+    def log_info(self, info, warning_type, state=None):
 
         self.warning_type = warning_type
 
-        unix_time = time.time()
+        unix_time = clock_to_unix(clock_now())
         local_time = datetime.fromtimestamp(time.mktime(time.localtime(unix_time)))
         unix_timestamp = ("%.3f" % round(unix_time, 3)).replace(".", "")
 
@@ -41,3 +52,449 @@ class Logger():
         with open(f"{self.timestamp}_log.txt", "a+") as log_file:
            
             log_file.write(f"{self.warning_type}, {info}, {unix_timestamp}, {local_time}\n")
+
+
+
+
+class BufferedLogger(Logger):
+    """
+    the logger that keeps one log file open and writes the records in batches
+    """
+
+    def __init__(self, batch_size=256, flush_interval=1.0, max_records=8192, durability="flush"):
+        super().__init__()
+
+        self.batch_size = int(batch_size) # the number of buffered records that triggers a flush
+        self.flush_interval = float(flush_interval) # the time (s) after which buffered records are flushed
+        self.max_records = int(max(max_records, batch_size)) # the upper bound of the buffer if the file cannot be written
+        self.durability = str(durability) # "none" = leave in the file buffer, "flush" = hand to the OS, "fsync" = force to disk
+
+        if self.durability not in ("none", "flush", "fsync"):
+            raise ValueError(f"Durability policy not supported: {self.durability}")
+
+        self.log_buffer = [] # the records waiting to be written
+        self.log_file = None # the open log file, opened on the first flush
+        self.dropped_records = 0 # the number of records dropped because the buffer was full
+        self.last_flush_time = time.monotonic() # the time of the last flush
+        self.flush_failed = False # True after a failed flush, until a flush succeeds
+        self.cached_second = None # the second of the cached local time
+        self.cached_local_time = None # the local time string of the cached second
+
+
+    def format_time(self, unix_time):
+
+        unix_timestamp = ("%.3f" % round(unix_time, 3)).replace(".", "")
+
+        # the local time only changes once per second, so reuse the last one
+        second = int(unix_time)
+        if second != self.cached_second:
+            self.cached_second = second
+            self.cached_local_time = str(datetime.fromtimestamp(time.mktime(time.localtime(unix_time))))
+
+        return unix_timestamp, self.cached_local_time
+
+
+    def log_data_received(self, data, time_received, state=None):
+        unix_timestamp, local_time = self.format_time(clock_to_unix(time_received))
+        self.log_record(f"{data} data received, {unix_timestamp}, {local_time}\n")
+
+
+    def log_info(self, info, warning_type, state=None):
+
+        self.warning_type = warning_type
+
+        unix_timestamp, local_time = self.format_time(clock_to_unix(clock_now()))
+        self.log_record(f"{self.warning_type}, {info}, {unix_timestamp}, {local_time}\n")
+
+
+    def log_record(self, record):
+
+        self.log_buffer.append(record)
+        if self.flush_failed and len(self.log_buffer) > self.max_records: # bounded while the file cannot be written
+            del self.log_buffer[0]
+            self.dropped_records += 1
+
+        # flush when the batch is full or the last flush is too old; after a failure only on time, so that a
+        # missing disk is not retried for every record
+        full = len(self.log_buffer) >= self.batch_size and not self.flush_failed
+        if full or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.log_flush()
+
+
+    def log_flush(self):
+
+        self.last_flush_time = time.monotonic()
+
+        if not self.log_buffer:
+            return
+
+        try:
+            if self.log_file is None:
+                self.log_file = open(f"{self.timestamp}_log.txt", "a+")
+
+            self.log_file.write("".join(self.log_buffer))
+
+            if self.durability != "none":
+                self.log_file.flush() # hand the batch to the OS
+            if self.durability == "fsync":
+                os.fsync(self.log_file.fileno()) # wait until the batch is on disk
+
+        except OSError as error:
+            # keep the records for the next flush, but never grow past the bound
+            overflow = len(self.log_buffer) - self.max_records
+            if overflow > 0:
+                del self.log_buffer[:overflow] # drop the oldest records
+                self.dropped_records += overflow
+            if not self.flush_failed:
+                print(f"Log flush failed: {error}")
+                self.flush_failed = True
+            return
+
+        if self.flush_failed:
+            print(f"Log flush recovered, {self.dropped_records} records dropped so far")
+            self.flush_failed = False
+
+        self.log_buffer.clear()
+
+
+    def log_close(self):
+
+        # write everything left and release the file at shutdown
+        self.log_flush()
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+
+
+class AsyncLogger(BufferedLogger):
+    """
+    the logger that hands the records to a background thread, so that writing never holds up the warning
+    """
+
+    def __init__(self, queue_size=16384, overflow="drop_oldest", batch_size=256, flush_interval=0.5, max_records=8192, durability="flush"):
+        super().__init__(batch_size, flush_interval, max_records, durability)
+
+        self.queue_size = int(queue_size) # the maximum number of records waiting for the writer
+        self.overflow = str(overflow) # "drop_oldest" = drop the oldest record when full, "block" = wait for the writer
+
+        if self.overflow not in ("drop_oldest", "block"):
+            raise ValueError(f"Overflow policy not supported: {self.overflow}")
+
+        # the bounded queue between the warning and the writer, append and popleft are atomic
+        self.log_queue = deque(maxlen=self.queue_size if self.overflow == "drop_oldest" else None)
+        self.queue_not_full = threading.Condition() # used by the "block" policy to wait for the writer
+        self.writer_wakeup = threading.Event() # wake the writer before the flush interval has passed
+        self.writer_running = True
+        self.drain_hooks = [] # called by the writer after every drain, e.g. BinaryLogger.log_flush
+
+        # backpressure metrics
+        self.max_queue_depth = 0 # the highest number of records waiting for the writer
+        self.flush_count = 0 # the number of batches written
+        self.last_flush_latency = 0.0 # the time (s) the last batch took to write
+        self.max_flush_latency = 0.0 # the longest time (s) a batch took to write
+        self.total_flush_latency = 0.0 # the total time (s) spent writing batches
+
+        self.writer_thread = threading.Thread(target=self.log_writer, name="log writer", daemon=True)
+        self.writer_thread.start()
+
+
+    def log_data_received(self, data, time_received, state=None):
+        self.log_enqueue((data, clock_to_unix(time_received), None))
+
+
+    def log_info(self, info, warning_type, state=None):
+        self.log_enqueue((info, clock_to_unix(clock_now()), warning_type))
+
+
+    def log_enqueue(self, item):
+
+        if self.overflow == "block":
+            if len(self.log_queue) >= self.queue_size:
+                with self.queue_not_full:
+                    self.writer_wakeup.set()
+                    while len(self.log_queue) >= self.queue_size and self.writer_running:
+                        self.queue_not_full.wait(self.flush_interval)
+
+        elif len(self.log_queue) >= self.queue_size:
+            self.dropped_records += 1 # the oldest record is pushed out by the append below
+
+        self.log_queue.append(item)
+
+        depth = len(self.log_queue)
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        if depth >= self.batch_size:
+            self.writer_wakeup.set()
+
+
+    def log_writer(self):
+
+        while self.writer_running:
+            self.writer_wakeup.wait(self.flush_interval)
+            self.writer_wakeup.clear()
+            self.log_drain()
+
+        self.log_drain() # write what was queued before shutdown
+
+
+    def log_drain(self):
+
+        # format the queued records on the writer thread
+        while self.log_queue:
+            try:
+                data, record_time, warning_type = self.log_queue.popleft()
+            except IndexError:
+                break
+
+            unix_timestamp, local_time = self.format_time(record_time)
+            if warning_type is None:
+                self.log_buffer.append(f"{data} data received, {unix_timestamp}, {local_time}\n")
+            else:
+                self.warning_type = warning_type
+                self.log_buffer.append(f"{warning_type}, {data}, {unix_timestamp}, {local_time}\n")
+
+        if self.overflow == "block":
+            with self.queue_not_full:
+                self.queue_not_full.notify_all()
+
+        if self.log_buffer:
+            flush_start = time.perf_counter()
+            self.log_flush()
+            flush_latency = time.perf_counter() - flush_start
+
+            self.flush_count += 1
+            self.last_flush_latency = flush_latency
+            self.max_flush_latency = max(self.max_flush_latency, flush_latency)
+            self.total_flush_latency += flush_latency
+
+        for hook in self.drain_hooks:
+            hook()
+
+
+    def log_stats(self):
+
+        return {
+            "queue_depth": len(self.log_queue),
+            "max_queue_depth": self.max_queue_depth,
+            "dropped_records": self.dropped_records,
+            "flush_count": self.flush_count,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "mean_flush_latency": self.total_flush_latency / self.flush_count if self.flush_count else 0.0,
+        }
+
+
+    def log_close(self):
+
+        # stop the writer, let it drain the queue, then release the file
+        self.writer_running = False
+        self.writer_wakeup.set()
+        self.writer_thread.join()
+
+        super().log_close()
+
+
+
+
+# the binary log layout: a 16 byte header followed by fixed-width 16 byte records
+BINARY_LOG_MAGIC = b"HFTLOG01"
+BINARY_LOG_HEADER = struct.Struct("<8sII") # magic, record size, reserved
+BINARY_LOG_RECORD = struct.Struct("<dBBbB4x") # unix time, event, channel, AOI flag, state
+BINARY_LOG_DTYPE = np.dtype([("time", "<f8"), ("event", "u1"), ("channel", "u1"), ("aoi", "i1"), ("state", "u1"), ("reserved", "<u4")])
+
+# the codes of the events and channels stored in the binary log, 255 = unknown
+LOG_EVENTS = (
+    "data received",
+    "warning detection started",
+    "glance detection started",
+    "glance detection ended",
+    "warning detection and glance detection ended",
+    "warning triggered",
+    "warning disabled",
+    "exception",
+)
+LOG_CHANNELS = ("", "Visual", "Auditory", "Haptic", "Network")
+LOG_UNKNOWN = 255
+
+# the values of the AOI flag, -1 = neither "true" nor "false"
+LOG_AOI_FLAGS = {"true": 1, "false": 0}
+
+
+
+class BinaryLogger(Logger):
+    """
+    the logger that writes fixed-width binary records, optionally alongside a text logger
+    """
+
+    def __init__(self, text_logger=None, batch_size=1024, flush_interval=1.0, max_records=65536):
+        super().__init__()
+
+        self.text_logger = text_logger # the logger that still writes the text log, None = binary only
+        self.batch_size = int(batch_size) # the number of buffered records that triggers a flush
+        self.flush_interval = float(flush_interval) # the time (s) after which buffered records are flushed
+        self.max_records = int(max(max_records, batch_size)) # the upper bound of the records kept if the file cannot be written
+
+        # the packed records waiting to be written; append and popleft are atomic, so the writer thread of an
+        # AsyncLogger can take them while the warning adds more
+        self.log_queue = deque()
+        self.log_buffer = bytearray() # the records taken from the queue, only touched by the flushing thread
+        self.log_file = None # the open binary log, opened on the first flush
+        self.last_flush_time = time.monotonic()
+        self.dropped_records = 0 # the number of records dropped because the file could not be written
+        self.flush_failed = False # True after a failed flush, until a flush succeeds
+
+        # with an AsyncLogger the binary records are written on its writer thread, never on the caller's
+        self.writer = text_logger if hasattr(text_logger, "drain_hooks") else None
+        if self.writer is not None:
+            self.writer.drain_hooks.append(self.log_flush)
+
+        self.event_codes = {event: code for code, event in enumerate(LOG_EVENTS)}
+        self.channel_codes = {channel: code for code, channel in enumerate(LOG_CHANNELS)}
+
+
+    def create_timestamp(self):
+        super().create_timestamp()
+
+        if self.text_logger is not None:
+            self.text_logger.timestamp = self.timestamp # both logs share the study timestamp
+
+
+    def log_data_received(self, data, time_received, state=None):
+
+        if self.text_logger is not None:
+            self.text_logger.log_data_received(data, time_received, state)
+
+        self.log_record(clock_to_unix(time_received), 0, 0, LOG_AOI_FLAGS.get(data, -1), state)
+
+
+    def log_info(self, info, warning_type, state=None):
+
+        self.warning_type = warning_type
+
+        if self.text_logger is not None:
+            self.text_logger.log_info(info, warning_type, state)
+
+        event = self.event_codes.get(info, LOG_UNKNOWN)
+        channel = self.channel_codes.get(warning_type, LOG_UNKNOWN)
+        self.log_record(clock_to_unix(clock_now()), event, channel, -1, state)
+
+
+    def log_record(self, unix_time, event, channel, aoi, state):
+
+        self.log_queue.append(BINARY_LOG_RECORD.pack(unix_time, event, channel, aoi, LOG_UNKNOWN if state is None else state))
+        if self.flush_failed and len(self.log_queue) > self.max_records: # bounded while the file cannot be written
+            try:
+                self.log_queue.popleft()
+                self.dropped_records += 1
+            except IndexError:
+                pass # the writer thread took the records meanwhile
+
+        if self.writer is not None:
+            if len(self.log_queue) >= self.batch_size:
+                self.writer.writer_wakeup.set()
+            return
+
+        # flush when the batch is full or the last flush is too old; after a failure only on time, so that a
+        # missing disk is not retried for every record
+        full = len(self.log_queue) >= self.batch_size and not self.flush_failed
+        if full or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.log_flush()
+
+
+    def log_flush(self):
+
+        self.last_flush_time = time.monotonic()
+
+        while self.log_queue:
+            self.log_buffer += self.log_queue.popleft()
+
+        if not self.log_buffer:
+            return
+
+        try:
+            if self.log_file is None:
+                path = f"{self.timestamp}_log.bin"
+                self.log_file = open(path, "ab")
+                if self.log_file.tell() == 0: # new file, write the header first
+                    self.log_file.write(BINARY_LOG_HEADER.pack(BINARY_LOG_MAGIC, BINARY_LOG_RECORD.size, 0))
+
+            self.log_file.write(self.log_buffer)
+            self.log_file.flush()
+
+        except OSError as error:
+            # keep the records for the next flush, but never grow past the bound
+            overflow = len(self.log_buffer) // BINARY_LOG_RECORD.size - self.max_records
+            if overflow > 0:
+                del self.log_buffer[:overflow * BINARY_LOG_RECORD.size] # drop the oldest records
+                self.dropped_records += overflow
+            if not self.flush_failed:
+                print(f"Binary log flush failed: {error}")
+                self.flush_failed = True
+            return
+
+        if self.flush_failed:
+            print(f"Binary log flush recovered, {self.dropped_records} records dropped so far")
+            self.flush_failed = False
+
+        self.log_buffer.clear()
+
+
+    def log_close(self):
+
+        # an AsyncLogger drains its queue, and the binary records with it, before its writer stops
+        if self.text_logger is not None and hasattr(self.text_logger, "log_close"):
+            self.text_logger.log_close()
+
+        self.log_flush()
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+
+def load_binary_log(path):
+
+    # check the header and map the records without reading them
+    with open(path, "rb") as log_file:
+        magic, record_size, _ = BINARY_LOG_HEADER.unpack(log_file.read(BINARY_LOG_HEADER.size))
+
+    if magic != BINARY_LOG_MAGIC or record_size != BINARY_LOG_DTYPE.itemsize:
+        raise ValueError(f"Not a binary log: {path}")
+
+    # a session killed while flushing can leave a partial last record, only the complete records are mapped
+    records = (os.path.getsize(path) - BINARY_LOG_HEADER.size) // BINARY_LOG_DTYPE.itemsize
+    if records <= 0: # np.memmap cannot map an empty file
+        return np.zeros(0, dtype=BINARY_LOG_DTYPE)
+
+    return np.memmap(path, dtype=BINARY_LOG_DTYPE, mode="r", offset=BINARY_LOG_HEADER.size, shape=(records,))
+
+
+def binary_log_to_text(binary_path, text_path=None):
+
+    # convert a binary log back into the text log format of Logger
+    if text_path is None:
+        text_path = os.path.splitext(binary_path)[0] + ".txt"
+
+    records = load_binary_log(binary_path)
+    aoi_values = {1: "true", 0: "false", -1: "None"}
+
+    with open(text_path, "w") as log_file:
+        for record in records:
+            unix_time = float(record["time"])
+            unix_timestamp = ("%.3f" % round(unix_time, 3)).replace(".", "")
+            local_time = datetime.fromtimestamp(time.mktime(time.localtime(unix_time)))
+
+            event = int(record["event"])
+            if event == 0:
+                log_file.write(f"{aoi_values[int(record['aoi'])]} data received, {unix_timestamp}, {local_time}\n")
+            else:
+                channel = int(record["channel"])
+                warning_type = LOG_CHANNELS[channel] if channel < len(LOG_CHANNELS) else "Unknown"
+                info = LOG_EVENTS[event] if event < len(LOG_EVENTS) else "unknown"
+                log_file.write(f"{warning_type}, {info}, {unix_timestamp}, {local_time}\n")
+
+    return text_path
@@ -2,6 +2,10 @@
 from matplotlib.pyplot import fill
 from warning_display import *
 from logger import * # info logging
+from warning_dispatch import * # one decision per packet for all warnings
+from latency import * # end-to-end latency
+from audio import * # preloaded warning sounds
+from visual import * # render-once warning icons
 
 # external libraries used
 import tkinter as tk
@@ -17,9 +21,14 @@ class MainApplication(tk.Tk):
         self.configure(bg="black")
 
 
-    def create_logger(self):
+    def create_logger(self, binary_log=False):
+
+        self.text_logger_obj = AsyncLogger() # write the log in batches on a background thread
+        self.logger_obj = self.text_logger_obj
+
+        if binary_log:
+            self.logger_obj = BinaryLogger(self.text_logger_obj) # write the binary log alongside the text log
 
-        self.logger_obj = Logger()
         self.logger_obj.create_timestamp()
 
 
@@ -29,6 +38,11 @@ class MainApplication(tk.Tk):
         self.conn_object.conn_sock()
         self.conn_object.conn_connect()
 
+        # receive on a separate thread so that the GUI never waits for data
+        self.latency_obj = LatencyRecorder() # measure from packet arrival to warning output
+        self.receiver_object = ConnReceiver(self.conn_object, parser=AOIFlagParser(), latency=self.latency_obj)
+        self.receiver_object.recv_start()
+
 
     def create_visual_warning(self):
 
@@ -54,24 +68,31 @@ class MainApplication(tk.Tk):
     
     def create_both_warning(self):
 
+        self.warning_canvas = WarningCanvas(self) # all icons on one canvas, toggled without relayout
         self.visual_warning = WarningDisplay("Visual", self.conn_object)
-        self.visual_warning.warning_init("icon.png", 0.160, 3.000, self.logger_obj)
+        self.visual_warning.warning_init("icon.png", 0.160, 3.000, self.logger_obj, canvas=self.warning_canvas)
+        self.sound_bank = SoundBank() # decode the sounds once, small mixer buffer
         self.auditory_warning = WarningDisplay("Auditory", self.conn_object)
-        self.auditory_warning.warning_init("warning.mp3", 0.160, 3.500, self.logger_obj)
+        self.auditory_warning.warning_init("warning.mp3", 0.160, 3.500, self.logger_obj, self.sound_bank)
+        print(f"Sound latency: {self.sound_bank.sound_latency()}")
+
+        # log each packet once and share the decisions between warnings with the same periods
+        self.dispatcher = WarningDispatcher(self.logger_obj, self.latency_obj)
+        self.visual_warning.latency_init(self.latency_obj)
+        self.auditory_warning.latency_init(self.latency_obj)
+        self.dispatcher.add_channel(self.visual_warning, 0.160, 3.000)
+        self.dispatcher.add_channel(self.auditory_warning, 0.160, 3.500)
+
+        # change the state at the deadlines even when no packet arrives
+        self.warning_timer = WarningTimer(self, self.dispatcher, self.receiver_object)
 
 
     def refresh_both_warning(self):
 
-        # establish the data stream
-        data_stream = self.conn_object.conn_recv_with_time()
+        # process every packet received since the last refresh, already parsed by the receiver
+        self.dispatcher.dispatch_packets(self.receiver_object.recv_pending())
+        self.warning_timer.timer_arm()
 
-        # get the boolean data
-        data = data_stream[0][0].decode("utf-8")[-6:-1].strip() # extract the data from the received UDP data
-        # get the data receive time
-        time_received = data_stream[1] # time when the data is received
-        
-        self.visual_warning.warning(data, time_received)
-        self.auditory_warning.warning(data, time_received)
         self.after(5, self.refresh_both_warning)
 
 
@@ -87,4 +108,10 @@ if __name__ == "__main__":
 
     main.after(5, main.refresh_both_warning)
 
-    main.mainloop()
\ No newline at end of file
+    main.mainloop()
+
+    main.receiver_object.recv_stop() # stop receiving
+    main.logger_obj.log_close() # write the remaining log records
+    print(f"Logger: {main.text_logger_obj.log_stats()}")
+    print(f"Warning onset: {main.dispatcher.onset_stats()}")
+    main.latency_obj.latency_write(f"{main.logger_obj.timestamp}_latency.json") # the latency histograms of the session
\ No newline at end of file
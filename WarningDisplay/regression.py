@@ -0,0 +1,132 @@
+# regression checks of the vectorized and deadline-driven logic against step-by-step runs on seeded random sessions
+
+# internal libraries used
+from warning_engine import * # replay and the live state machine
+from rule_engine import compile_rules # the deadlines of the window rule
+
+# external libraries used
+import argparse
+import json
+import sys
+
+import numpy as np
+
+
+
+def random_session(rng, max_samples=400, mean_interval=0.05, mean_run=5):
+
+    # timestamps with random intervals and AOI flags in runs, with a few samples that are neither in nor out
+    samples = int(rng.integers(1, max_samples))
+    timestamps = np.cumsum(rng.exponential(mean_interval, samples))
+    runs = rng.integers(AOI_FALSE, AOI_TRUE + 1, samples // mean_run + 1)
+    aoi = np.repeat(runs, mean_run)[:samples].astype(np.int8)
+    aoi[rng.random(samples) < 0.02] = -1
+
+    return timestamps, aoi
+
+
+def step_events(timestamps, aoi, glance, warning, timers=False):
+
+    # the events of WarningEngine fed one sample at a time, with timers the deadlines fire before the next sample
+    # as with WarningDispatcher.dispatch_in_order
+    engine = WarningEngine(glance, warning)
+    aoi_values = {AOI_TRUE: "true", AOI_FALSE: "false"}
+    events = []
+
+    for time_received, flag in zip(timestamps.tolist(), aoi.tolist()):
+        deadline = engine.next_deadline()
+        while timers and deadline is not None and time_received >= deadline:
+            event = engine.expire(time_received)
+            if event is None:
+                break
+            events.append((deadline, event))
+            deadline = engine.next_deadline()
+
+        event = engine.step(aoi_values.get(flag), time_received)
+        if event is not None:
+            events.append((time_received, event))
+
+    return events
+
+
+def check_replay(sessions=300, seed=0, glance=0.160, warning=1.0):
+
+    # replay against WarningEngine.step, with and without timers
+    rng = np.random.default_rng(seed)
+    mismatches = {False: 0, True: 0}
+
+    for _ in range(sessions):
+        timestamps, aoi = random_session(rng)
+
+        for timers in (False, True):
+            expected = step_events(timestamps, aoi, glance, warning, timers)
+            replayed = replay(timestamps, aoi, glance, warning, timers).events()
+
+            same_events = [event for _, event in expected] == [event for _, event in replayed]
+            if not same_events or not np.allclose([t for t, _ in expected], [t for t, _ in replayed]):
+                mismatches[timers] += 1
+
+    return {"sessions": sessions, "mismatches": mismatches[False], "mismatches_timers": mismatches[True]}
+
+
+def window_time(intervals, now, window):
+
+    # the time the value held in the last window, summed over all intervals
+    return sum(max(min(end, now) - max(start, now - window), 0.0) for start, end in intervals)
+
+
+def check_window_rule(sessions=100, seed=0, threshold=0.5, window=2.0):
+
+    # the state of a WindowRule after every sample against the window time summed from scratch
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+
+    for _ in range(sessions):
+        timestamps, aoi = random_session(rng, mean_run=8)
+        engine = compile_rules([{"type": "window", "name": "window", "aoi": "road", "threshold": threshold, "window": window}])
+
+        intervals = [] # the (start, end) of the samples outside the road, end = inf while it lasts
+        for time_received, flag in zip(timestamps.tolist(), aoi.tolist()):
+            if flag not in (AOI_TRUE, AOI_FALSE):
+                continue
+
+            engine.step({"road": flag == AOI_TRUE}, time_received)
+
+            if flag == AOI_FALSE and (not intervals or intervals[-1][1] != float("inf")):
+                intervals.append((time_received, float("inf")))
+            elif flag == AOI_TRUE and intervals and intervals[-1][1] == float("inf"):
+                intervals[-1] = (intervals[-1][0], time_received)
+
+            expected = window_time(intervals, time_received, window) >= threshold
+            # exactly at the threshold the rounding of either sum can differ
+            if engine.rule_state()["window"] != expected and abs(window_time(intervals, time_received, window) - threshold) > 1e-9:
+                mismatches += 1
+                break
+
+    return {"sessions": sessions, "mismatches": mismatches}
+
+
+def run_checks(quick=False):
+
+    scale = 10 if quick else 1
+    return {
+        "replay": check_replay(300 // scale),
+        "window_rule": check_window_rule(100 // scale),
+    }
+
+
+def checks_failed(results):
+    return any(result["mismatches"] or result.get("mismatches_timers") for result in results.values())
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the vectorized and deadline-driven decisions with step-by-step runs.")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the sessions")
+    args = parser.parse_args()
+
+    results = run_checks(args.quick)
+    print(json.dumps(results, indent=2))
+
+    sys.exit(1 if checks_failed(results) else 0)
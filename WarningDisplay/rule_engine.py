@@ -0,0 +1,444 @@
+# declarative warning rules over many AOIs, compiled into one index so a sample only touches the rules of its AOIs
+
+# internal libraries used
+from warning_engine import WARNING_TRIGGERED, WARNING_DISABLED # the events passed to the warning outputs
+from glance_metrics import IntervalWindow, AttenDBuffer # sliding windows and the attention buffer
+
+# external libraries used
+import heapq # deadlines of all rules
+import json
+
+
+# the shortest time (s) between two evaluations of a rule, so that rounding cannot reschedule a deadline at the same time
+DEADLINE_RESOLUTION = 1e-6
+
+
+
+class Rule():
+    """
+    the base of the rules, on/off from the samples of its AOIs and from the time
+    """
+
+    def __init__(self, name, aois):
+
+        self.name = str(name) # the name of the rule, passed to its warning outputs
+        self.aois = tuple(aois) # the AOIs whose samples change the rule
+        self.on = False # True = warning triggered
+        self.deadline = None # the next time the rule must be evaluated without a sample
+
+
+    def rule_reset(self, now):
+        self.on = False
+        self.deadline = None
+
+
+    def rule_sample(self, aoi, value, now):
+        pass # called only when the value of one of its AOIs changed
+
+
+    def rule_active(self, now):
+        return False # True = the warning should be on
+
+
+    def rule_deadline(self, now):
+        return None # the earliest time at which rule_active can change without a sample
+
+
+    def rule_evaluate(self, now):
+
+        # switch the rule on/off, returns the event or None
+        active = self.rule_active(now)
+
+        if active and not self.on:
+            self.on = True
+            return WARNING_TRIGGERED
+
+        elif not active and self.on:
+            self.on = False
+            return WARNING_DISABLED
+
+        return None
+
+
+
+class DwellRule(Rule):
+    """
+    the rule that is on while an AOI has kept a value for longer than a duration, e.g. eyes off road > 3 s
+    """
+
+    def __init__(self, name, aoi, duration, value=False):
+        super(DwellRule, self).__init__(name, (aoi,))
+
+        self.value = value # the AOI value that counts, False = outside the AOI
+        self.duration = float(duration) # the time (s) the value must last
+
+
+    def rule_reset(self, now):
+        super().rule_reset(now)
+        self.dwell_start = None # the time the AOI took the value, None = it has another value
+
+
+    def rule_sample(self, aoi, value, now):
+
+        if value == self.value:
+            self.dwell_start = now
+        else:
+            self.dwell_start = None
+
+
+    def rule_active(self, now):
+        return self.dwell_start is not None and now - self.dwell_start >= self.duration
+
+
+    def rule_deadline(self, now):
+
+        if self.dwell_start is not None and not self.on:
+            return self.dwell_start + self.duration
+
+        return None
+
+
+
+class WindowRule(Rule):
+    """
+    the rule that is on while an AOI had a value for longer than a threshold in the last window, e.g. eyes off road > 2 s in any 6 s
+    """
+
+    def __init__(self, name, aoi, threshold, window, value=False):
+        super(WindowRule, self).__init__(name, (aoi,))
+
+        self.value = value # the AOI value that counts, False = outside the AOI
+        self.threshold = float(threshold) # the time (s) in the window that switches the rule on
+        self.window = float(window) # the length (s) of the sliding window
+
+
+    def rule_reset(self, now):
+        super().rule_reset(now)
+        self.history = IntervalWindow(self.window) # the intervals with the value
+
+
+    def rule_sample(self, aoi, value, now):
+
+        if value == self.value:
+            self.history.window_start(now)
+        else:
+            self.history.window_end(now)
+
+
+    def rule_active(self, now):
+        return self.history.window_time(now) >= self.threshold
+
+
+    def rule_deadline(self, now):
+
+        # while the value lasts the window time only grows, otherwise it only shrinks, so only these two cases can switch
+        # the rule; walk the start of the window over the intervals: while the value lasts the time grows in the gaps
+        # between the intervals, otherwise it shrinks inside them
+        history = self.history
+
+        if history.interval_start is not None and not self.on:
+            needed = self.threshold - history.window_time(now)
+            elapsed = 0.0
+            position = now - self.window
+
+            for start, end in list(history.intervals) + [(history.interval_start, None)]:
+                gap = max(start - position, 0.0)
+                if gap >= needed:
+                    return now + max(elapsed + needed, DEADLINE_RESOLUTION)
+
+                needed -= gap
+                if end is None:
+                    return None # the whole window has the value and stays below the threshold
+
+                elapsed += gap + end - max(start, position)
+                position = end
+
+        elif history.interval_start is None and self.on:
+            needed = history.window_time(now) - self.threshold
+            elapsed = 0.0
+            position = now - self.window
+
+            for start, end in history.intervals:
+                start = max(start, position)
+                if end - start > needed:
+                    return now + elapsed + (start - position) + needed + DEADLINE_RESOLUTION
+
+                needed -= end - start
+                elapsed += end - position
+                position = end
+
+            return now + elapsed + DEADLINE_RESOLUTION
+
+        return None
+
+
+
+class AbsenceRule(Rule):
+    """
+    the rule that is on while none of its AOIs had a glance for longer than a timeout, e.g. no mirror glance in 10 s
+    """
+
+    def __init__(self, name, aois, timeout, min_glance=0.0):
+        super(AbsenceRule, self).__init__(name, aois)
+
+        self.timeout = float(timeout) # the time (s) without a glance that switches the rule on
+        self.min_glance = float(min_glance) # the shortest time (s) on an AOI that counts as a glance
+
+
+    def rule_reset(self, now):
+        super().rule_reset(now)
+
+        self.inside = set() # the AOIs currently looked at
+        self.glance_start = None # the time the current glance started, None = no AOI is looked at
+        self.last_glance = now # the last time a glance was in progress, the start counts as one
+
+
+    def rule_sample(self, aoi, value, now):
+
+        was_glancing = self.glance_counts(now)
+
+        if value is True:
+            self.inside.add(aoi)
+        else:
+            self.inside.discard(aoi)
+
+        if self.inside and self.glance_start is None:
+            self.glance_start = now
+
+        elif not self.inside and self.glance_start is not None:
+            if was_glancing:
+                self.last_glance = now
+            self.glance_start = None
+
+
+    def glance_counts(self, now):
+        return self.glance_start is not None and now - self.glance_start >= self.min_glance
+
+
+    def rule_active(self, now):
+        return not self.glance_counts(now) and now - self.last_glance >= self.timeout
+
+
+    def rule_deadline(self, now):
+
+        deadlines = []
+        if self.glance_start is not None and not self.glance_counts(now):
+            deadlines.append(self.glance_start + self.min_glance) # the glance starts to count
+        if not self.on and not self.glance_counts(now):
+            deadlines.append(self.last_glance + self.timeout) # the timeout runs out
+
+        return min(deadlines) if deadlines else None
+
+
+
+class AttenDRule(Rule):
+    """
+    the rule that is on while the AttenD buffer is empty, until it refills above the release level
+    """
+
+    def __init__(self, name, aoi, mirror_aois=(), release=0.0, **buffer_args):
+        super(AttenDRule, self).__init__(name, (aoi,) + tuple(mirror_aois))
+
+        self.road_aoi = aoi # the road AOI, True = on the road
+        self.mirror_aois = set(mirror_aois) # the mirrors and the speedometer, which drain the buffer only after a latency
+        self.release = float(release) # the buffer (s) that switches the rule off again
+        self.buffer_args = buffer_args # capacity, return_latency, mirror_latency, decrease_rate and increase_rate
+
+
+    def rule_reset(self, now):
+        super().rule_reset(now)
+
+        self.buffer = AttenDBuffer(**self.buffer_args)
+        self.buffer.attend_reset(now)
+        self.inside = set() # the AOIs currently looked at
+
+
+    def rule_sample(self, aoi, value, now):
+
+        if value is True:
+            self.inside.add(aoi)
+        else:
+            self.inside.discard(aoi)
+
+        if self.road_aoi in self.inside:
+            self.buffer.attend_update("road", now)
+        elif self.inside & self.mirror_aois:
+            self.buffer.attend_update("mirror", now)
+        else:
+            self.buffer.attend_update("away", now)
+
+
+    def rule_active(self, now):
+
+        value = self.buffer.attend_value(now)
+        return value <= self.release if self.on else value <= 0.0
+
+
+    def rule_deadline(self, now):
+
+        if self.on:
+            deadline = self.buffer.attend_level_time(self.release)
+            return None if deadline is None else deadline + DEADLINE_RESOLUTION
+
+        return self.buffer.attend_empty_time()
+
+
+
+# the rule types of the declarative rule files
+RULE_TYPES = {
+    "dwell": DwellRule,
+    "window": WindowRule,
+    "absence": AbsenceRule,
+    "attend": AttenDRule,
+}
+
+
+
+class RuleEngine():
+    """
+    the compiled rules: an index from each AOI to its rules and one heap of the deadlines of all rules
+    """
+
+    def __init__(self, rules, logger_obj=None):
+
+        self.rules = list(rules)
+        self.logger = logger_obj # logs every sample once, None = not logged
+        self.aoi_rules = {} # AOI -> the rules that depend on it
+        for rule in self.rules:
+            for aoi in rule.aois:
+                self.aoi_rules.setdefault(aoi, []).append(rule)
+
+        self.channels = {rule.name: [] for rule in self.rules} # rule name -> warning outputs
+        self.aoi_values = {} # AOI -> the last value received
+        self.deadlines = [] # heap of (deadline, order, rule), an entry is stale when the rule has another deadline
+        self.deadline_order = 0 # breaks ties between equal deadlines
+        self.started = False # the rules start at the first sample
+
+
+    def add_channel(self, channel, rule_name):
+        self.channels[rule_name].append(channel)
+
+
+    def rule_schedule(self, rule, now):
+
+        deadline = rule.rule_deadline(now)
+        if deadline is not None and deadline <= now: # rounding, e.g. (start + timeout) - start < timeout
+            deadline = now + DEADLINE_RESOLUTION
+
+        if deadline != rule.deadline:
+            rule.deadline = deadline
+            if deadline is not None:
+                heapq.heappush(self.deadlines, (deadline, self.deadline_order, rule))
+                self.deadline_order += 1
+
+
+    def rule_update(self, rule, now, events):
+
+        event = rule.rule_evaluate(now)
+        if event is not None:
+            events.append((rule.name, event))
+            for channel in self.channels[rule.name]:
+                channel.warning_event(event, int(rule.on))
+
+        self.rule_schedule(rule, now)
+
+
+    def step(self, values, time_received):
+
+        # values is {AOI: value} as returned by FieldParser, returns the (rule name, event) pairs
+        if not self.started:
+            self.started = True
+            for rule in self.rules:
+                rule.rule_reset(time_received)
+
+        if self.logger is not None:
+            self.logger.log_data_received(" ".join(f"{aoi}={value}" for aoi, value in values.items()), time_received)
+
+        events = self.expire(time_received)
+
+        # only the rules of the AOIs that changed are updated, each once in the order they changed
+        changed = {}
+        for aoi, value in values.items():
+            rules = self.aoi_rules.get(aoi)
+            if rules is None or self.aoi_values.get(aoi) == value:
+                continue
+
+            self.aoi_values[aoi] = value
+            for rule in rules:
+                rule.rule_sample(aoi, value, time_received)
+                changed[rule] = None
+
+        for rule in changed:
+            self.rule_update(rule, time_received, events)
+
+        return events
+
+
+    def next_deadline(self):
+
+        # the earliest time at which any rule changes without a sample, dropping the stale heap entries
+        while self.deadlines and self.deadlines[0][0] != self.deadlines[0][2].deadline:
+            heapq.heappop(self.deadlines)
+
+        return self.deadlines[0][0] if self.deadlines else None
+
+
+    def expire(self, now):
+
+        # evaluate the rules whose deadline has passed, returns the (rule name, event) pairs
+        events = []
+
+        deadline = self.next_deadline()
+        while deadline is not None and deadline <= now:
+            _, _, rule = heapq.heappop(self.deadlines)
+            rule.deadline = None
+            self.rule_update(rule, deadline, events) # evaluated at its deadline, so the event time is exact
+
+            deadline = self.next_deadline()
+
+        return events
+
+
+    def rule_state(self):
+        return {rule.name: rule.on for rule in self.rules}
+
+
+    def dispatch_in_order(self, values, times):
+
+        # the same interface as WarningDispatcher, for engine_loop
+        for data, time_received in zip(values, times):
+            if isinstance(data, dict):
+                self.step(data, time_received)
+
+
+    def dispatch_expire(self, now):
+        self.expire(now)
+
+
+
+def compile_rules(specs, logger_obj=None):
+
+    # specs is a list of {"type": "dwell" | "window" | "absence" | "attend", "name": ..., and the arguments of the rule}, e.g.
+    # {"type": "window", "name": "eyes off road", "aoi": "road", "threshold": 2.0, "window": 6.0}
+    # {"type": "absence", "name": "no mirror glance", "aois": ["mirror_left", "mirror_right"], "timeout": 10.0}
+    # {"type": "attend", "name": "attention buffer empty", "aoi": "road", "mirror_aois": ["mirror_left"], "release": 1.0}
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        rule_type = spec.pop("type")
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"Rule type not supported: {rule_type}")
+
+        rules.append(RULE_TYPES[rule_type](**spec))
+
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("Rule names must be unique")
+
+    return RuleEngine(rules, logger_obj)
+
+
+def load_rules(path, logger_obj=None):
+
+    with open(path, "r") as rules_file:
+        return compile_rules(json.load(rules_file), logger_obj)
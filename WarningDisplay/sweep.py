@@ -0,0 +1,135 @@
+# parameter sweep of the glance and warning periods over recorded sessions
+
+# internal libraries used
+from logger import load_binary_log, LOG_EVENTS # recorded sessions
+from warning_engine import * # decision logic
+
+# external libraries used
+import argparse
+import csv
+import itertools
+import math
+import os
+from multiprocessing import Pool
+from collections import OrderedDict # per-worker session cache
+
+import numpy as np
+
+
+# the sessions last loaded by this process, path -> session, most recent last; the jobs of a session are
+# consecutive, so a worker only needs the few sessions its recent chunks came from
+session_cache = OrderedDict()
+SESSION_CACHE_SIZE = 4
+
+# the number of records filtered at a time, so only the two columns of the data records are copied into memory
+LOAD_CHUNK = 1 << 20
+
+
+def load_session(path):
+
+    # the timestamps and AOI flags of the data records in a binary log
+    if path in session_cache:
+        session_cache.move_to_end(path)
+        return session_cache[path]
+
+    records = load_binary_log(path)
+    times = []
+    flags = []
+    for start in range(0, len(records), LOAD_CHUNK):
+        chunk = records[start:start + LOAD_CHUNK]
+        data = chunk["event"] == 0
+        times.append(np.asarray(chunk["time"][data]))
+        flags.append(np.asarray(chunk["aoi"][data]))
+
+    timestamps = np.concatenate(times) if times else np.zeros(0, dtype=records.dtype["time"])
+    aoi = np.concatenate(flags) if flags else np.zeros(0, dtype=records.dtype["aoi"])
+
+    session = (timestamps, aoi)
+    session_cache[path] = session
+    if len(session_cache) > SESSION_CACHE_SIZE:
+        session_cache.popitem(last=False)
+
+    return session
+
+
+def session_metrics(timestamps, aoi, glance, warning, false_alarm_window=1.0, timers=False):
+
+    # the warning statistics of one session for one pair of periods
+    result = replay(timestamps, aoi, glance, warning, timers)
+    codes = {event: code for code, event in enumerate(LOG_EVENTS)}
+
+    minutes = (timestamps[-1] - timestamps[0]) / 60.0 if len(timestamps) > 1 else 0.0
+    warnings = len(result.warning_on)
+
+    # the time from the start of the warning detection to the warning
+    detection_start = result.event_time[result.event_code == codes[WARNING_DETECTION_STARTED]]
+    previous_start = np.searchsorted(detection_start, result.warning_on, "right") - 1
+    time_to_warning = result.warning_on - detection_start[previous_start] if warnings else np.zeros(0)
+
+    # a warning the driver cancels within the window was already being acted on: a false alarm
+    durations = result.warning_off - result.warning_on
+
+    return {
+        "glance_period": glance,
+        "warning_period": warning,
+        "samples": len(timestamps),
+        "minutes": minutes,
+        "warnings": warnings,
+        "warnings_per_minute": warnings / minutes if minutes else 0.0,
+        "mean_time_to_warning": float(time_to_warning.mean()) if warnings else float("nan"),
+        "mean_warning_duration": float(durations.mean()) if warnings else float("nan"),
+        "false_alarms": int(np.count_nonzero(durations < false_alarm_window)),
+    }
+
+
+def run_job(job):
+
+    path, glance, warning, false_alarm_window, timers = job
+    timestamps, aoi = load_session(path)
+
+    row = {"session": os.path.basename(path)}
+    row.update(session_metrics(timestamps, aoi, glance, warning, false_alarm_window, timers))
+
+    return row
+
+
+def run_sweep(sessions, glance_periods, warning_periods, processes=None, false_alarm_window=1.0, timers=False):
+
+    # one job per (session, glance, warning), the jobs of a session stay together so a worker mostly reuses its cache;
+    # small chunks keep every worker busy even with a single session
+    parameters = list(itertools.product(glance_periods, warning_periods))
+    jobs = [(path, glance, warning, false_alarm_window, timers) for path in sessions for glance, warning in parameters]
+    processes = processes or os.cpu_count() or 1
+    chunksize = max(1, math.ceil(len(jobs) / (processes * 4)))
+
+    with Pool(processes) as pool:
+        rows = pool.map(run_job, jobs, chunksize=chunksize)
+
+    return rows
+
+
+def write_table(rows, path):
+
+    with open(path, "w", newline="") as table_file:
+        writer = csv.DictWriter(table_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replay binary logs under a grid of glance and warning periods.")
+    parser.add_argument("sessions", nargs="+", help="binary logs (*_log.bin)")
+    parser.add_argument("--glance", type=float, nargs="+", default=[0.160], help="glance periods (s)")
+    parser.add_argument("--warning", type=float, nargs="+", default=[3.000], help="warning periods (s)")
+    parser.add_argument("--false-alarm-window", type=float, default=1.0, help="warnings shorter than this (s) count as false alarms")
+    parser.add_argument("--timers", action="store_true", help="fire the timeouts at their deadline like WarningTimer")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--output", default="sweep.csv", help="the result table")
+    args = parser.parse_args()
+
+    rows = run_sweep(args.sessions, args.glance, args.warning, args.processes, args.false_alarm_window, args.timers)
+    write_table(rows, args.output)
+
+    print(f"{len(rows)} results written to {args.output}")
@@ -0,0 +1,241 @@
+# record and replay of D-Lab UDP streams, and synthetic AOI streams for load tests
+
+# internal libraries used
+from input import * # data stream
+from clock import clock_now # monotonic packet times
+
+# external libraries used
+import argparse
+import math
+import random
+import socket
+import struct
+import time
+
+
+# the recording layout: a header followed by (time since the first packet, payload length, payload) records
+RECORDING_MAGIC = b"HFTUDP01"
+RECORDING_RECORD = struct.Struct("<dI")
+
+
+
+class UDPRecorder():
+    """
+    the recorder that captures raw datagrams with their arrival times to a compact file
+    """
+
+    def __init__(self, conn_ip, conn_port, conn_buffer=65536):
+
+        self.conn_object = Conn("UDP", conn_ip, conn_port, conn_buffer)
+        self.conn_object.conn_sock()
+        self.conn_object.conn_connect()
+
+        self.recorded_packets = 0 # the number of datagrams written
+
+
+    def record(self, path, duration=None, max_packets=None):
+
+        # record until the duration (s) has passed, max_packets were received, or Ctrl+C
+        batch = None
+        first_time = None
+        start = clock_now()
+
+        with open(path, "wb") as recording_file:
+            recording_file.write(RECORDING_MAGIC)
+
+            try:
+                while duration is None or clock_now() - start < duration:
+                    batch = self.conn_object.recv_many(256, 0.2, batch)
+
+                    for index in range(len(batch)):
+                        if batch.truncated[index]: # only the first bytes were received, the recording would replay them as valid data
+                            continue
+                        if first_time is None:
+                            first_time = batch.times[index]
+
+                        payload = batch.packet(index)
+                        recording_file.write(RECORDING_RECORD.pack(batch.times[index] - first_time, len(payload)))
+                        recording_file.write(payload)
+                        self.recorded_packets += 1
+
+                    if max_packets is not None and self.recorded_packets >= max_packets:
+                        break
+
+            except KeyboardInterrupt:
+                pass
+
+        return self.recorded_packets
+
+
+
+def load_recording(path):
+
+    # the (time since the first packet, payload) of every recorded datagram
+    with open(path, "rb") as recording_file:
+        data = recording_file.read()
+
+    if not data.startswith(RECORDING_MAGIC):
+        raise ValueError(f"Not a UDP recording: {path}")
+
+    packets = []
+    offset = len(RECORDING_MAGIC)
+    while offset < len(data):
+        packet_time, length = RECORDING_RECORD.unpack_from(data, offset)
+        offset += RECORDING_RECORD.size
+        packets.append((packet_time, data[offset:offset + length]))
+        offset += length
+
+    return packets
+
+
+def write_recording(path, packets):
+
+    # write (time, payload) pairs, e.g. from synthetic_aoi_stream, in the recording layout
+    with open(path, "wb") as recording_file:
+        recording_file.write(RECORDING_MAGIC)
+        for packet_time, payload in packets:
+            recording_file.write(RECORDING_RECORD.pack(packet_time, len(payload)))
+            recording_file.write(payload)
+
+
+
+class UDPReplayer():
+    """
+    the replayer that resends recorded or synthetic datagrams to Conn, at 1x, Nx or maximum speed
+    """
+
+    def __init__(self, conn_ip="localhost", conn_port=20001):
+
+        self.address = (str(conn_ip), int(conn_port))
+        self.conn_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.sent_packets = 0 # the number of datagrams sent
+        self.max_lateness = 0.0 # the latest (s) a datagram was sent after its scheduled time
+
+
+    def replay(self, packets, speed=1.0):
+
+        # speed 1 = real time, N = N times faster, 0 = as fast as possible
+        start = clock_now()
+
+        for packet_time, payload in packets:
+            if speed > 0:
+                due = start + packet_time / speed
+                remaining = due - clock_now()
+
+                # sleep most of the wait, then spin for the last moment to keep the timing precise
+                if remaining > 0.002:
+                    time.sleep(remaining - 0.001)
+                while clock_now() < due:
+                    pass
+
+                self.max_lateness = max(self.max_lateness, clock_now() - due)
+
+            self.conn_socket.sendto(payload, self.address)
+            self.sent_packets += 1
+
+        return clock_now() - start
+
+
+
+def dwell_time(distribution, mean):
+
+    # one dwell time (s) with the given mean
+    if distribution == "fixed":
+        return mean
+    elif distribution == "exponential":
+        return random.expovariate(1.0 / mean)
+    elif distribution == "uniform":
+        return random.uniform(0.0, 2.0 * mean)
+    elif distribution == "lognormal": # a spread typical of glance durations
+        sigma = 0.5
+        return random.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+    else:
+        raise ValueError(f"Distribution not supported: {distribution}")
+
+
+def synthetic_aoi_stream(duration, rate=60.0, on_dwell=("lognormal", 4.0), off_dwell=("lognormal", 1.0),
+                         burst_every=None, burst_size=10, seed=None):
+
+    # (time, payload) of an AOI stream at rate Hz alternating in/out dwells drawn from the distributions;
+    # every burst_every seconds, burst_size packets are sent at once as when D-Lab catches up
+    if rate <= 0:
+        raise ValueError(f"The rate must be positive: {rate}")
+    for name, (_, mean) in (("on", on_dwell), ("off", off_dwell)):
+        if mean <= 0: # a dwell that never ends would never advance the stream
+            raise ValueError(f"The mean {name} dwell time must be positive: {mean}")
+    if burst_every is not None and burst_every < 0:
+        raise ValueError(f"The burst interval cannot be negative: {burst_every}")
+
+    if seed is not None:
+        random.seed(seed)
+
+    packets = []
+    period = 1.0 / rate
+    packet_time = 0.0
+    inside = True
+    dwell_end = dwell_time(*on_dwell)
+    next_burst = burst_every if burst_every else None
+
+    while packet_time < duration:
+        while packet_time >= dwell_end:
+            inside = not inside
+            dwell_end += dwell_time(*(on_dwell if inside else off_dwell))
+
+        payload = b"AOI\ttrue\n" if inside else b"AOI\tfalse\n"
+
+        if next_burst is not None and packet_time >= next_burst:
+            packets.extend((packet_time, payload) for _ in range(burst_size))
+            next_burst += burst_every
+        else:
+            packets.append((packet_time, payload))
+
+        packet_time += period
+
+    return packets
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Record, replay or generate D-Lab UDP streams.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record the datagrams sent to a port")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--ip", default="localhost")
+    record_parser.add_argument("--port", type=int, default=20001)
+    record_parser.add_argument("--duration", type=float, default=None, help="seconds, until Ctrl+C by default")
+
+    replay_parser = commands.add_parser("replay", help="resend a recording")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--ip", default="localhost")
+    replay_parser.add_argument("--port", type=int, default=20001)
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = maximum")
+
+    synth_parser = commands.add_parser("synth", help="generate a synthetic AOI stream")
+    synth_parser.add_argument("path", help="the recording to write")
+    synth_parser.add_argument("--duration", type=float, default=600.0, help="seconds")
+    synth_parser.add_argument("--rate", type=float, default=60.0, help="packets per second, e.g. 1000")
+    synth_parser.add_argument("--distribution", default="lognormal", choices=("fixed", "exponential", "uniform", "lognormal"))
+    synth_parser.add_argument("--on-dwell", type=float, default=4.0, help="mean time inside the AOI (s)")
+    synth_parser.add_argument("--off-dwell", type=float, default=1.0, help="mean time outside the AOI (s)")
+    synth_parser.add_argument("--burst-every", type=float, default=None, help="seconds between bursts")
+    synth_parser.add_argument("--burst-size", type=int, default=10, help="packets per burst")
+    synth_parser.add_argument("--seed", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        recorder = UDPRecorder(args.ip, args.port)
+        print(f"{recorder.record(args.path, args.duration)} datagrams recorded to {args.path}")
+
+    elif args.command == "replay":
+        replayer = UDPReplayer(args.ip, args.port)
+        elapsed = replayer.replay(load_recording(args.path), args.speed)
+        print(f"{replayer.sent_packets} datagrams sent in {elapsed:.3f} s, at most {replayer.max_lateness * 1000:.3f} ms late")
+
+    else:
+        packets = synthetic_aoi_stream(args.duration, args.rate, (args.distribution, args.on_dwell), (args.distribution, args.off_dwell),
+                                       args.burst_every, args.burst_size, args.seed)
+        write_recording(args.path, packets)
+        print(f"{len(packets)} datagrams written to {args.path}")
@@ -0,0 +1,156 @@
+# render-once warning icons, toggled without relayout
+
+# external libraries used
+import tkinter as tk
+from PIL import ImageTk, Image # use of image, "Pillow"
+import pygame # fullscreen surface
+import os # filepath
+
+
+def icon_anchors(anchors):
+
+    # resolve the relative positions of the icons, those without one (None) are spread evenly across the middle row
+    automatic = [name for name, anchor in anchors.items() if anchor is None]
+    resolved = dict(anchors)
+    for index, name in enumerate(automatic):
+        resolved[name] = ((index + 1) / (len(automatic) + 1), 0.5)
+
+    return resolved
+
+
+
+class WarningCanvas(tk.Canvas):
+    """
+    the single canvas holding every warning icon, decoded once and shown or hidden by changing the item state
+    """
+
+    icon_cache = {} # path -> PhotoImage, shared by all canvases so each icon is decoded once
+
+    def __init__(self, master=None):
+        super(WarningCanvas, self).__init__(master, background="black", borderwidth=0, highlightthickness=0)
+        self.pack(fill="both", expand=1)
+
+        self.icons = {} # name -> canvas item
+        self.anchors = {} # name -> relative position, None = placed automatically
+        self.icon_visible = {} # name -> True if shown
+        self.flash_timers = {} # name -> pending Tk timer of a flashing icon
+
+        self.bind("<Configure>", self.icon_center) # only a resize moves the icons
+
+
+    def icon_image(self, icon_path):
+
+        icon_path = os.path.expanduser(icon_path)
+        if icon_path not in WarningCanvas.icon_cache:
+            WarningCanvas.icon_cache[icon_path] = ImageTk.PhotoImage(Image.open(icon_path))
+
+        return WarningCanvas.icon_cache[icon_path]
+
+
+    def icon_add(self, name, icon_path, anchor=None):
+
+        # draw the icon once, hidden, at a position relative to the canvas size, side by side with the other icons by default
+        item = self.create_image(0, 0, image=self.icon_image(icon_path), state="hidden")
+        self.icons[name] = item
+        self.anchors[name] = anchor
+        self.icon_visible[name] = False
+        self.icon_center()
+
+
+    def icon_center(self, event=None):
+
+        width = self.winfo_width()
+        height = self.winfo_height()
+        for name, (x, y) in icon_anchors(self.anchors).items():
+            self.coords(self.icons[name], width * x, height * y)
+
+
+    def icon_show(self, name):
+
+        if not self.icon_visible[name]:
+            self.itemconfigure(self.icons[name], state="normal")
+            self.icon_visible[name] = True
+
+
+    def icon_hide(self, name):
+
+        self.flash_stop(name)
+        if self.icon_visible[name]:
+            self.itemconfigure(self.icons[name], state="hidden")
+            self.icon_visible[name] = False
+
+
+    def icon_flash(self, name, on_ms=500, off_ms=500):
+
+        # toggle the icon on a timer until icon_hide
+        self.flash_stop(name)
+
+        def flash_toggle(visible):
+            self.itemconfigure(self.icons[name], state="normal" if visible else "hidden")
+            self.icon_visible[name] = visible
+            self.flash_timers[name] = self.after(on_ms if visible else off_ms, flash_toggle, not visible)
+
+        flash_toggle(True)
+
+
+    def flash_stop(self, name):
+
+        timer = self.flash_timers.pop(name, None)
+        if timer is not None:
+            self.after_cancel(timer)
+
+
+
+class WarningSurface():
+    """
+    the fullscreen pygame surface alternative, presented with vsync; it is only redrawn on show and hide, so it cannot flash
+    """
+
+    def __init__(self, size=(0, 0), fullscreen=True):
+
+        pygame.display.init()
+        flags = pygame.FULLSCREEN | pygame.SCALED if fullscreen else pygame.SCALED
+        self.screen = pygame.display.set_mode(size, flags, vsync=1)
+
+        self.icons = {} # name -> (surface, position)
+        self.anchors = {} # name -> relative position, None = placed automatically
+        self.icon_visible = {} # name -> True if shown
+
+
+    def icon_add(self, name, icon_path, anchor=None):
+
+        # decode and convert the icon once to the pixel format of the screen
+        surface = pygame.image.load(os.path.expanduser(icon_path)).convert_alpha()
+        self.icons[name] = (surface, None)
+        self.anchors[name] = anchor
+        self.icon_visible[name] = False
+
+        # adding an icon can move the automatically placed ones
+        width, height = self.screen.get_size()
+        for icon_name, (x, y) in icon_anchors(self.anchors).items():
+            icon_surface = self.icons[icon_name][0]
+            self.icons[icon_name] = (icon_surface, icon_surface.get_rect(center=(int(width * x), int(height * y))))
+
+
+    def icon_show(self, name):
+        if not self.icon_visible[name]:
+            self.icon_visible[name] = True
+            self.surface_present()
+
+
+    def icon_hide(self, name):
+        if self.icon_visible[name]:
+            self.icon_visible[name] = False
+            self.surface_present()
+
+
+    def surface_present(self):
+
+        # redraw the visible icons and present them at the next vertical blank
+        self.screen.fill((0, 0, 0))
+        for name, (surface, position) in self.icons.items():
+            if self.icon_visible[name]:
+                self.screen.blit(surface, position)
+
+        pygame.display.flip()
+        pygame.event.pump() # keep the window responsive
@@ -0,0 +1,229 @@
+# one decision per packet, fanned out to any number of warning outputs
+
+# internal libraries used
+from warning_engine import * # decision logic
+from clock import clock_now # monotonic deadlines
+
+# external libraries used
+import socket # network warning output
+import time
+import math
+
+
+
+class WarningDispatcher():
+    """
+    the dispatcher that logs every packet once, runs one state machine per pair of periods and passes the events to the warning channels
+    """
+
+    def __init__(self, logger_obj, latency=None):
+
+        self.logger = logger_obj
+        self.latency = latency # the LatencyRecorder of the decide stage, None = not measured
+        self.groups = {} # (glance, warning) -> [engine, channels]
+        self.onset_latencies = [] # the time (s) from each warning deadline to the output of each channel
+
+
+    def add_channel(self, channel, glance, warning):
+
+        # channels with the same periods share one state machine
+        key = (glance, warning)
+        if key not in self.groups:
+            self.groups[key] = [WarningEngine(glance, warning), []]
+
+        self.groups[key][1].append(channel)
+
+        engine = self.groups[key][0]
+        if hasattr(channel, "engine_share"): # no second state machine in the display that could disagree
+            channel.engine_share(engine)
+
+        return engine
+
+
+    def dispatch_state(self):
+
+        # the state logged with the data, that of the first state machine
+        for engine, _ in self.groups.values():
+            return engine.warning_state()
+
+        return None
+
+
+    def dispatch(self, data, time_received):
+
+        if self.latency is not None:
+            self.latency.latency_origin = time_received # the outputs measure from the packet
+
+        self.logger.log_data_received(data, time_received, self.dispatch_state())
+
+        for engine, channels in self.groups.values():
+            event = engine.step(data, time_received)
+
+            if event is not None:
+                self.dispatch_event(engine, channels, event)
+
+        if self.latency is not None:
+            self.latency.latency_stage("decide", time_received)
+
+
+    def dispatch_expire(self, now):
+
+        # fire the transitions whose deadline has passed, called by WarningTimer
+        for engine, channels in self.groups.values():
+            if self.latency is not None:
+                self.latency.latency_origin = engine.next_deadline() # the outputs measure from the deadline
+
+            event = engine.expire(now)
+
+            if event is not None:
+                self.dispatch_event(engine, channels, event)
+
+
+    def dispatch_event(self, engine, channels, event):
+
+        state = engine.warning_state()
+        deadline = engine.warning_detection_start_time + engine.warning_period if event == WARNING_TRIGGERED else None
+
+        for channel in channels:
+            channel.warning_event(event, state)
+
+            if deadline is not None:
+                # how late this warning came out compared with the end of the warning period, logged with the warning
+                onset = clock_now() - deadline
+                self.onset_latencies.append(onset)
+                self.logger.log_info(f"warning onset latency {onset * 1000:.3f} ms", channel.warning_type, state)
+
+
+    def next_deadline(self):
+
+        # the earliest time at which any state machine changes without a packet
+        deadlines = [engine.next_deadline() for engine, _ in self.groups.values()]
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+
+        return min(deadlines) if deadlines else None
+
+
+    def onset_stats(self):
+
+        latencies = sorted(self.onset_latencies)
+        if not latencies:
+            return {"warnings": 0}
+
+        return {
+            "warnings": len(latencies),
+            "mean_onset_latency": sum(latencies) / len(latencies),
+            "median_onset_latency": latencies[len(latencies) // 2],
+            "max_onset_latency": latencies[-1],
+        }
+
+
+    def dispatch_packets(self, packets):
+
+        # packets in the format of ConnReceiver.recv_pending, parsed by the receiver; in order with the deadlines
+        # between them like dispatch_in_order, so the Tk loop consumes the same samples as replay
+        self.dispatch_in_order([data for (data, _), _ in packets], [time_received for _, time_received in packets])
+
+
+    def dispatch_in_order(self, values, times):
+
+        # dispatch parsed packets, firing a deadline that passed between two packets before the later one
+        deadline = self.next_deadline()
+
+        for data, time_received in zip(values, times):
+            if deadline is not None and time_received >= deadline:
+                self.dispatch_expire(time_received)
+
+            self.dispatch(data, time_received)
+            deadline = self.next_deadline()
+
+
+
+class WarningTimer():
+    """
+    the timer on the Tk loop that fires the transitions of a dispatcher at their deadlines, even if no packet arrives
+    """
+
+    def __init__(self, tk_root, dispatcher, receiver=None):
+
+        self.root = tk_root # any Tk widget, used for after and after_cancel
+        self.dispatcher = dispatcher
+        self.receiver = receiver # the ConnReceiver whose packets are dispatched before the deadline fires
+        self.timer_id = None # the pending Tk timer
+        self.timer_deadline = None # the deadline of the pending Tk timer
+
+
+    def timer_arm(self):
+
+        # arm the timer for the earliest deadline, call after the packets are dispatched
+        deadline = self.dispatcher.next_deadline()
+        if deadline == self.timer_deadline:
+            return
+
+        if self.timer_id is not None:
+            self.root.after_cancel(self.timer_id)
+            self.timer_id = None
+
+        self.timer_deadline = deadline
+        if deadline is None:
+            return
+
+        delay = max(0, math.ceil((deadline - clock_now()) * 1000)) # round up, firing early only re-arms the timer
+        self.timer_id = self.root.after(delay, self.timer_fire)
+
+
+    def timer_fire(self):
+
+        self.timer_id = None
+        self.timer_deadline = None
+
+        # packets that arrived before the deadline still count, so dispatch them first
+        if self.receiver is not None:
+            self.dispatcher.dispatch_packets(self.receiver.recv_pending())
+
+        self.dispatcher.dispatch_expire(clock_now())
+        self.timer_arm()
+
+
+
+class NetworkWarning():
+    """
+    the warning output that sends the warning on/off over UDP, e.g. to a haptic device or another display
+    """
+
+    def __init__(self, warning_type, conn_ip, conn_port, logger_obj=None):
+
+        self.warning_type = warning_type # the name of the output in the log, e.g. "Haptic" or "Network"
+        self.addresses = [(str(conn_ip), int(conn_port))] # the receivers of the messages
+        self.logger = logger_obj
+        self.conn_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+
+
+    def add_address(self, conn_ip, conn_port):
+        self.addresses.append((str(conn_ip), int(conn_port))) # e.g. one display client per screen
+
+
+    def send_message(self, state):
+
+        # "{warning type},{on/off},{system time}", the time lets the receiver measure the delivery delay
+        message = f"{self.warning_type},{state},{time.time():.6f}\n".encode("utf-8")
+        for address in self.addresses:
+            self.conn_socket.sendto(message, address)
+
+
+    def start_warning(self):
+        self.send_message("on")
+
+
+    def stop_warning(self):
+        self.send_message("off")
+
+
+    def warning_event(self, event, state=None):
+
+        if event == WARNING_TRIGGERED:
+            self.start_warning()
+        elif event == WARNING_DISABLED:
+            self.stop_warning()
+
+        if self.logger is not None:
+            self.logger.log_info(event, self.warning_type, state)
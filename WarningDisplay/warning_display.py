@@ -2,13 +2,13 @@
 
 # internal libraries used
 from input import * # data stream
+from warning_engine import * # decision logic
 
 # external libraries used
 import tkinter as tk
 from PIL import ImageTk, Image # use of image, "Pillow"
 import pygame # warning sound
 import os # filepath
-import time # UNIX time
 
 
 
@@ -18,27 +18,59 @@ class WarningDisplay(tk.Frame):
         super(WarningDisplay, self).__init__()
         self.warning_type = warning_type
         self.conn = conn_obj
+        self.latency = None # the LatencyRecorder of the render and play stages, None = not measured
 
     
     def logger_init(self, logger_obj):
         self.logger = logger_obj
+
+
+    def latency_init(self, latency_obj):
+        self.latency = latency_obj
         
 
-    def sound_warning_init(self, warning_sound_path):
+    def sound_warning_init(self, warning_sound_path, sound_bank=None):
+
+        self.sound_bank = sound_bank # the SoundBank with the decoded sounds, None = stream the file with pygame.mixer.music
+        self.warning_sound = warning_sound_path
+
+        if self.sound_bank is not None:
+            self.sound_bank.sound_load(self.warning_sound, warning_sound_path) # decode once into PCM
+            return
 
         pygame.mixer.init() # initialize the mixer module from pygame
         pygame.mixer.music.load(os.path.expanduser(warning_sound_path))
 
     
     def start_sound_warning(self):
-        pygame.mixer.music.play() # start to play the warning sound
+        if self.sound_bank is not None:
+            self.sound_bank.sound_play(self.warning_sound) # start to play the decoded warning sound
+        else:
+            pygame.mixer.music.play() # start to play the warning sound
+
+        if self.latency is not None:
+            self.latency.latency_stage("play")
 
     
     def stop_sound_warning(self):
-        pygame.mixer.music.stop() # stop playing the warning sound
+        if self.sound_bank is not None:
+            self.sound_bank.sound_stop(self.warning_sound)
+        else:
+            pygame.mixer.music.stop() # stop playing the warning sound
     
 
-    def visual_warning_init(self, warning_icon_path):
+    def visual_warning_init(self, warning_icon_path, canvas=None, flash=None):
+
+        self.canvas = canvas # the WarningCanvas or WarningSurface with the icon, None = a Label packed and unpacked
+        self.flash = flash # (on ms, off ms) to flash the icon on the canvas, None = steady
+        self.warning_name = warning_icon_path
+
+        if self.flash is not None and not hasattr(self.canvas, "icon_flash"):
+            raise ValueError("Flashing needs a WarningCanvas")
+
+        if self.canvas is not None:
+            self.canvas.icon_add(self.warning_name, warning_icon_path) # decoded and drawn once, hidden
+            return
 
         self.warning_icon = ImageTk.PhotoImage(Image.open(os.path.expanduser(warning_icon_path))) # load the image with the icon in file system
 
@@ -49,37 +81,48 @@ class WarningDisplay(tk.Frame):
 
 
     def start_visual_warning(self):
-        self.warning_display.pack(fill="both", expand=1) # display the warning icon
+        if self.canvas is None:
+            self.warning_display.pack(fill="both", expand=1) # display the warning icon
+        elif self.flash is not None:
+            self.canvas.icon_flash(self.warning_name, *self.flash) # flash the warning icon
+        else:
+            self.canvas.icon_show(self.warning_name) # display the warning icon
+
+        if self.latency is not None:
+            self.latency.latency_stage("render")
+            # the icon is drawn once Tk is idle again
+            self.after_idle(self.latency.latency_stage, "idle", self.latency.latency_origin)
 
 
     def stop_visual_warning(self):
-        self.warning_display.pack_forget() # stop displaying the warning
+        if self.canvas is None:
+            self.warning_display.pack_forget() # stop displaying the warning
+        else:
+            self.canvas.icon_hide(self.warning_name)
    
    
     def param_init(self, glance, warning):
 
-        # variable initialization
-        self.current_state = False # a flag to mark the current state of the system, True = warning triggered
-        self.warning_detection = False # a flag to mark if the warning detection has started, True = started
-        self.glance_detection = False # a flag to mark if the glance detection has started, True = started
-        self.warning_detection_start_time = time.time() # warning detection period start time
-        self.glance_detection_strart_time = time.time() # glance detection period start time
+        # the state machine deciding when to start and stop the warning, replaced by the shared one of a WarningDispatcher
+        self.engine = WarningEngine(glance, warning)
+
+
+    def engine_share(self, engine):
 
-        # period definition
-        self.glance_period = glance # set the glance interval
-        self.warning_period = warning # set time interval for warning
+        # called by WarningDispatcher.add_channel: the dispatcher decides, so warning_state reports its state machine
+        self.engine = engine
 
     
-    def warning_init(self, filename, glance, warning, logger_obj): # initialize the warning depending on the type
+    def warning_init(self, filename, glance, warning, logger_obj, sound_bank=None, canvas=None, flash=None): # initialize the warning depending on the type
         if self.warning_type == "Visual":
 
-            self.visual_warning_init(os.path.expanduser(os.getcwd() + "/" + filename)) # initialize visual warning
+            self.visual_warning_init(os.path.expanduser(os.getcwd() + "/" + filename), canvas, flash) # initialize visual warning
             self.param_init(glance, warning) # initialize parameters
             self.logger_init(logger_obj) # initialize the logger
 
         elif self.warning_type == "Auditory":
 
-            self.sound_warning_init(os.path.expanduser(os.getcwd() + "/" + filename)) # initialize visual warning
+            self.sound_warning_init(os.path.expanduser(os.getcwd() + "/" + filename), sound_bank) # initialize auditory warning
             self.param_init(glance, warning) # initialize parameters
             self.logger_init(logger_obj) # initialize the logger
 
@@ -99,85 +142,26 @@ class WarningDisplay(tk.Frame):
 
 
 
-    def warning(self, data, time_received):
-
-        self.logger.log_data_received(data, time_received)
-
-
-        if self.current_state == False and self.warning_detection == False and self.glance_detection == False:
-
-            if data == "false": # if the data is outside AOI
-
-                self.warning_detection = True # start the warning detection
-                self.warning_detection_start_time = time.time() # set the start of the warning detection period
-
-                self.logger.log_info("warning detection started", self.warning_type)
-
-        elif self.current_state == False and self.warning_detection == True and self.glance_detection == False:
-
-            if time_received - self.warning_detection_start_time < self.warning_period: # if the warning period has not exceeded the minimum trigger time
+    def warning_state(self):
+        return self.engine.warning_state()
 
-                if data == "true": # if the data is inside AOI
 
-                    self.glance_detection = True # start the glance detection
-                    self.glance_detection_strart_time = time.time() # set the start of the glance detection period
-
-                    self.logger.log_info("glance detection started", self.warning_type)
-
-            if time_received - self.warning_detection_start_time >= self.warning_period: # if the warning period has exceeded the minimum trigger time
-
-                self.current_state = True
-                self.warning_detection = False # end the warning detection
-
-                self.start_warning()
-
-                self.logger.log_info("warning triggered", self.warning_type)
-
-        elif self.current_state == False and self.warning_detection == True and self.glance_detection == True:
-
-            if time_received - self.glance_detection_strart_time < self.glance_period: # if it is not a glance
-
-                if data == "false":
-
-                    self.glance_detection = False # end the glance detection
-
-                    self.logger.log_info("glance detection ended", self.warning_type)
-
-            else:
-
-                self.warning_detection = False # end the warning detection
-                self.glance_detection = False # end the glance detection
-
-                self.logger.log_info("warning detection and glance detection ended", self.warning_type)
-
-        elif self.current_state == True and self.warning_detection == False and self.glance_detection == False:
-
-            if data == "true": # if the data is inside AOI        
-                
-                self.glance_detection = True # start the glance detection
-                self.glance_detection_strart_time = time.time() # set the start of the glance detection period
-
-                self.logger.log_info("glance detection started", self.warning_type)
-
-
-        elif self.current_state == True and self.warning_detection == False and self.glance_detection == True:
-
-            if time_received - self.glance_detection_strart_time < self.glance_period: # if it is not a glance
-
-                if data == "false":
-
-                    self.glance_detection = False # end the glance detection
+    def warning(self, data, time_received):
 
-                    self.logger.log_info("glance detection ended", self.warning_type)
+        # a display without a dispatcher decides on its own, kept for compatibility
+        self.logger.log_data_received(data, time_received, self.engine.warning_state())
 
-            else:
+        event = self.engine.step(data, time_received)
+        if event is not None:
+            self.warning_event(event, self.engine.warning_state())
 
-                self.current_state = False
-                self.glance_detection = False # end the glance detection
 
-                self.stop_warning()
+    def warning_event(self, event, state=None):
 
-                self.logger.log_info("warning disabled", self.warning_type)
+        # react to an event of the state machine, also called by WarningDispatcher
+        if event == WARNING_TRIGGERED:
+            self.start_warning()
+        elif event == WARNING_DISABLED:
+            self.stop_warning()
 
-        else:
-            self.logger.log_info("exception", self.warning_type)
\ No newline at end of file
+        self.logger.log_info(event, self.warning_type, state)
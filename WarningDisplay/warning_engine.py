@@ -0,0 +1,330 @@
+# the decision logic of the warning, independent of Tk and pygame
+
+# internal libraries used
+from logger import LOG_EVENTS # event codes shared with the binary log
+
+# external libraries used
+import numpy as np
+
+
+# the events of the state machine, the same text as in the log
+WARNING_DETECTION_STARTED = "warning detection started"
+GLANCE_DETECTION_STARTED = "glance detection started"
+GLANCE_DETECTION_ENDED = "glance detection ended"
+DETECTION_ENDED = "warning detection and glance detection ended"
+WARNING_TRIGGERED = "warning triggered"
+WARNING_DISABLED = "warning disabled"
+ENGINE_EXCEPTION = "exception"
+
+# the AOI flags of the replay, the same values as in the binary log
+AOI_TRUE = 1
+AOI_FALSE = 0
+
+
+
+class WarningEngine():
+    """
+    the glance/warning state machine, fed one sample at a time
+    """
+
+    def __init__(self, glance, warning):
+
+        # period definition
+        self.glance_period = glance # set the glance interval
+        self.warning_period = warning # set time interval for warning
+
+        self.engine_reset()
+
+
+    def engine_reset(self):
+
+        # variable initialization
+        self.current_state = False # a flag to mark the current state of the system, True = warning triggered
+        self.warning_detection = False # a flag to mark if the warning detection has started, True = started
+        self.glance_detection = False # a flag to mark if the glance detection has started, True = started
+        self.warning_detection_start_time = 0.0 # warning detection period start time
+        self.glance_detection_start_time = 0.0 # glance detection period start time
+
+
+    def warning_state(self):
+
+        # pack the three flags of the state machine into one number for the logger
+        return int(self.current_state) | int(self.warning_detection) << 1 | int(self.glance_detection) << 2
+
+
+    def step(self, data, time_received):
+
+        # advance the state machine by one sample, returns the event or None
+
+        if self.current_state == False and self.warning_detection == False and self.glance_detection == False:
+
+            if data == "false": # if the data is outside AOI
+
+                self.warning_detection = True # start the warning detection
+                self.warning_detection_start_time = time_received # set the start of the warning detection period
+
+                return WARNING_DETECTION_STARTED
+
+        elif self.current_state == False and self.warning_detection == True and self.glance_detection == False:
+
+            if time_received - self.warning_detection_start_time < self.warning_period: # if the warning period has not exceeded the minimum trigger time
+
+                if data == "true": # if the data is inside AOI
+
+                    self.glance_detection = True # start the glance detection
+                    self.glance_detection_start_time = time_received # set the start of the glance detection period
+
+                    return GLANCE_DETECTION_STARTED
+
+            else: # if the warning period has exceeded the minimum trigger time
+
+                self.current_state = True
+                self.warning_detection = False # end the warning detection
+
+                return WARNING_TRIGGERED
+
+        elif self.current_state == False and self.warning_detection == True and self.glance_detection == True:
+
+            if time_received - self.glance_detection_start_time < self.glance_period: # if it is not a glance
+
+                if data == "false":
+
+                    self.glance_detection = False # end the glance detection
+
+                    return GLANCE_DETECTION_ENDED
+
+            else:
+
+                self.warning_detection = False # end the warning detection
+                self.glance_detection = False # end the glance detection
+
+                return DETECTION_ENDED
+
+        elif self.current_state == True and self.warning_detection == False and self.glance_detection == False:
+
+            if data == "true": # if the data is inside AOI
+
+                self.glance_detection = True # start the glance detection
+                self.glance_detection_start_time = time_received # set the start of the glance detection period
+
+                return GLANCE_DETECTION_STARTED
+
+        elif self.current_state == True and self.warning_detection == False and self.glance_detection == True:
+
+            if time_received - self.glance_detection_start_time < self.glance_period: # if it is not a glance
+
+                if data == "false":
+
+                    self.glance_detection = False # end the glance detection
+
+                    return GLANCE_DETECTION_ENDED
+
+            else:
+
+                self.current_state = False
+                self.glance_detection = False # end the glance detection
+
+                return WARNING_DISABLED
+
+        else:
+            return ENGINE_EXCEPTION
+
+        return None
+
+
+    def next_deadline(self):
+
+        # the time at which the state changes even if no sample arrives, None if it only changes on a sample
+        if self.current_state == False and self.warning_detection == True and self.glance_detection == False:
+            return self.warning_detection_start_time + self.warning_period
+
+        elif self.glance_detection == True:
+            return self.glance_detection_start_time + self.glance_period
+
+        return None
+
+
+    def expire(self, now):
+
+        # make the time-based transition of step at the deadline, without a sample, returns the event or None
+
+        if self.current_state == False and self.warning_detection == True and self.glance_detection == False:
+
+            if now - self.warning_detection_start_time >= self.warning_period: # if the warning period has exceeded the minimum trigger time
+
+                self.current_state = True
+                self.warning_detection = False # end the warning detection
+
+                return WARNING_TRIGGERED
+
+        elif self.current_state == False and self.warning_detection == True and self.glance_detection == True:
+
+            if now - self.glance_detection_start_time >= self.glance_period: # if it is a glance
+
+                self.warning_detection = False # end the warning detection
+                self.glance_detection = False # end the glance detection
+
+                return DETECTION_ENDED
+
+        elif self.current_state == True and self.warning_detection == False and self.glance_detection == True:
+
+            if now - self.glance_detection_start_time >= self.glance_period: # if it is a glance
+
+                self.current_state = False
+                self.glance_detection = False # end the glance detection
+
+                return WARNING_DISABLED
+
+        return None
+
+
+
+class ReplayResult():
+    """
+    the events and warning intervals of a replayed session
+    """
+
+    def __init__(self, event_index, event_code, event_time, warning_on, warning_off):
+
+        self.event_index = event_index # the sample that caused each event, with timers the first sample after it
+        self.event_code = event_code # the code of each event, see LOG_EVENTS
+        self.event_time = event_time # the time of each event
+        self.warning_on = warning_on # the time each warning was triggered
+        self.warning_off = warning_off # the time each warning was disabled, the end of the session if still on
+
+
+    def events(self):
+
+        # the events as (time, event text) pairs
+        return [(float(event_time), LOG_EVENTS[code]) for event_time, code in zip(self.event_time, self.event_code)]
+
+
+
+def next_index(mask):
+
+    # for every sample, the index of the next sample (itself included) where mask is True, len(mask) if none
+    n = len(mask)
+    indices = np.where(mask, np.arange(n), n)
+    result = np.empty(n + 1, dtype=np.int64)
+    result[:n] = np.minimum.accumulate(indices[::-1])[::-1]
+    result[n] = n
+
+    return result
+
+
+def first_elapsed(timestamps, start_index, origin, period):
+
+    # the first sample from start_index on where timestamps - origin >= period, len(timestamps) if none
+    n = len(timestamps)
+    index = int(np.searchsorted(timestamps, origin + period, "left"))
+
+    # correct the rounding of origin + period against the comparison the live engine makes
+    while index > start_index and timestamps[index - 1] - origin >= period:
+        index -= 1
+    while index < n and timestamps[index] - origin < period:
+        index += 1
+
+    return max(index, start_index)
+
+
+def replay(timestamps, aoi, glance, warning, timers=False):
+
+    # replay the state machine of WarningEngine over a whole session at once;
+    # the time is only spent on the transitions: the next in/out sample comes from
+    # precomputed index arrays and the next timeout from a binary search;
+    # with timers the timeouts fire at their deadline like WarningTimer, and the
+    # next sample is processed in the new state instead of being consumed
+    timestamps = np.ascontiguousarray(timestamps, dtype=np.float64)
+    aoi = np.asarray(aoi)
+    if aoi.dtype == np.bool_:
+        aoi = aoi.astype(np.int8)
+
+    n = len(timestamps)
+    next_true = next_index(aoi == AOI_TRUE)
+    next_false = next_index(aoi == AOI_FALSE)
+
+    codes = {event: code for code, event in enumerate(LOG_EVENTS)}
+    event_index = []
+    event_code = []
+    event_time = []
+
+    def emit(index, event, time=None):
+        event_index.append(index)
+        event_code.append(codes[event])
+        event_time.append(timestamps[index] if time is None else time)
+
+    # the states of WarningEngine: (current_state, warning_detection, glance_detection)
+    IDLE, WARNING_DETECTION, GLANCE_DETECTION, WARNING_ON, WARNING_ON_GLANCE = range(5)
+
+    state = IDLE
+    index = 0
+    warning_start = 0.0
+    glance_start = 0.0
+
+    while index < n:
+
+        if state == IDLE:
+            index = next_false[index]
+            if index >= n:
+                break
+            warning_start = timestamps[index]
+            emit(index, WARNING_DETECTION_STARTED)
+            state = WARNING_DETECTION
+
+        elif state == WARNING_DETECTION:
+            deadline = first_elapsed(timestamps, index, warning_start, warning)
+            look_back = next_true[index]
+            if look_back < deadline:
+                index = look_back
+                glance_start = timestamps[index]
+                emit(index, GLANCE_DETECTION_STARTED)
+                state = GLANCE_DETECTION
+            elif deadline < n:
+                index = deadline
+                state = WARNING_ON
+                if timers:
+                    emit(index, WARNING_TRIGGERED, warning_start + warning)
+                    continue
+                emit(index, WARNING_TRIGGERED)
+            else:
+                break
+
+        elif state == WARNING_ON:
+            index = next_true[index]
+            if index >= n:
+                break
+            glance_start = timestamps[index]
+            emit(index, GLANCE_DETECTION_STARTED)
+            state = WARNING_ON_GLANCE
+
+        else: # GLANCE_DETECTION or WARNING_ON_GLANCE
+            deadline = first_elapsed(timestamps, index, glance_start, glance)
+            look_away = next_false[index]
+            if look_away < deadline:
+                index = look_away
+                emit(index, GLANCE_DETECTION_ENDED)
+                state = WARNING_DETECTION if state == GLANCE_DETECTION else WARNING_ON
+            elif deadline < n:
+                index = deadline
+                event = DETECTION_ENDED if state == GLANCE_DETECTION else WARNING_DISABLED
+                state = IDLE
+                if timers:
+                    emit(index, event, glance_start + glance)
+                    continue
+                emit(index, event)
+            else:
+                break
+
+        index += 1 # the sample that caused the transition is consumed
+
+    event_index = np.asarray(event_index, dtype=np.int64)
+    event_code = np.asarray(event_code, dtype=np.uint8)
+    event_time = np.asarray(event_time, dtype=np.float64)
+
+    # pair every trigger with the following disable, an open warning ends with the session
+    warning_on = event_time[event_code == codes[WARNING_TRIGGERED]]
+    warning_off = event_time[event_code == codes[WARNING_DISABLED]]
+    if len(warning_off) < len(warning_on):
+        warning_off = np.append(warning_off, timestamps[-1])
+
+    return ReplayResult(event_index, event_code, event_time, warning_on, warning_off)